@@ -0,0 +1,232 @@
+# admission.py
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Hashable, Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from lru import LRUCache
+
+load_dotenv()
+
+
+class Rejected(Exception):
+    """Request refused by admission control; maps to a 429/503 with Retry-After."""
+
+    def __init__(self, status_code: int, retry_after: float, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.detail = detail
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> Tuple[float, float]:
+    """Take one token from a bucket; returns (remaining tokens, seconds until a token is free or 0)."""
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class BucketStore:
+    """Token-bucket state. ``take`` spends one token for ``key`` and returns the
+    wait in seconds until one would be available (0 when the request may pass)."""
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        raise NotImplementedError
+
+
+class InMemoryBucketStore(BucketStore):
+    """Buckets in process memory, LRU-bounded so one-off client IPs can't grow it without limit."""
+
+    def __init__(self, maxsize: int = 100000):
+        self._buckets = LRUCache(maxsize=maxsize)
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key) or (burst, now)
+        tokens, wait = _refill(tokens, updated, now, rate, burst)
+        self._buckets.set(key, (tokens, now))
+        return wait
+
+
+class SqliteBucketStore(BucketStore):
+    """Buckets in a SQLite file, so every worker process on the host shares the same limits."""
+
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+        )
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        return await asyncio.to_thread(self._take, key, rate, burst)
+
+    def _take(self, key: str, rate: float, burst: float) -> float:
+        now = time.time()  # wall clock: shared between processes, unlike monotonic time
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                row = cursor.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                tokens, wait = _refill(*(row or (burst, now)), now, rate, burst)
+                cursor.execute(
+                    "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (key, tokens, now)
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        return wait
+
+
+class FairScheduler:
+    """Caps concurrent LLM-bound work and shares free slots round-robin across tenants.
+
+    When all ``capacity`` slots are busy, requests wait in a per-tenant queue;
+    each released slot goes to the next tenant in turn, so one busy tenant
+    cannot starve the others. A request that waits longer than ``max_wait``,
+    or finds its tenant already has ``max_queue`` waiters, is rejected with 503.
+    """
+
+    def __init__(self, capacity: int = 64, max_wait: float = 5.0, max_queue: int = 50):
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.active = 0
+        self.rejected = 0
+        self._queues: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @asynccontextmanager
+    async def slot(self, tenant: Hashable):
+        await self.acquire(tenant)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, tenant: Hashable):
+        if self.active < self.capacity and not self._queues:
+            self.active += 1
+            return
+
+        queue = self._queues.setdefault(tenant, deque())
+        if len(queue) >= self.max_queue:
+            self.rejected += 1
+            raise Rejected(503, self.max_wait, "Too many requests queued for this chatbot")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                return  # the slot was handed over as the wait expired
+            self._discard(tenant, waiter)
+            self.rejected += 1
+            raise Rejected(503, self.max_wait, "The assistant is busy, please retry shortly")
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                self._discard(tenant, waiter)
+            raise
+
+    def release(self):
+        # Hand the slot straight to the next tenant's oldest waiter, rotating tenants
+        while self._queues:
+            tenant, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(tenant)
+            else:
+                del self._queues[tenant]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _discard(self, tenant: Hashable, waiter: asyncio.Future):
+        waiter.cancel()
+        queue = self._queues.get(tenant)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[tenant]
+
+
+class AdmissionController:
+    """Token-bucket rate limits per business and per client IP, plus fair scheduling of LLM work.
+
+    Business limits come from the chatbot config (``rate_limit_per_minute`` /
+    ``rate_limit_burst``) and fall back to the defaults given here.
+    """
+
+    def __init__(
+        self,
+        store: BucketStore,
+        scheduler: FairScheduler,
+        business_rate: float = 60,
+        business_burst: float = 20,
+        ip_rate: float = 20,
+        ip_burst: float = 10
+    ):
+        self.store = store
+        self.scheduler = scheduler
+        self.business_rate = business_rate
+        self.business_burst = business_burst
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.limited = 0
+
+    async def check(self, tenant: str, client_ip: Optional[str], config: Optional[Mapping] = None):
+        """Spend one token from the tenant's and the client's buckets, or raise Rejected(429)."""
+        rate = (config or {}).get('rate_limit_per_minute') or self.business_rate
+        burst = (config or {}).get('rate_limit_burst') or self.business_burst
+        await self._take(f"tenant:{tenant}", rate, burst, "Rate limit exceeded for this chatbot")
+        if client_ip:
+            await self._take(f"ip:{client_ip}", self.ip_rate, self.ip_burst, "Too many messages, slow down")
+
+    def slot(self, tenant: str):
+        return self.scheduler.slot(tenant)
+
+    async def _take(self, key: str, per_minute: float, burst: float, detail: str):
+        if per_minute <= 0:
+            return
+        wait = await self.store.take(key, per_minute / 60, max(burst, 1))
+        if wait:
+            self.limited += 1
+            raise Rejected(429, wait, detail)
+
+
+def create_admission_from_env() -> AdmissionController:
+    store_path = os.getenv("ADMISSION_SQLITE_PATH")
+    return AdmissionController(
+        store=SqliteBucketStore(store_path) if store_path else InMemoryBucketStore(),
+        scheduler=FairScheduler(
+            capacity=int(os.getenv("CHAT_MAX_ACTIVE", "64")),
+            max_wait=float(os.getenv("CHAT_MAX_QUEUE_WAIT_SECONDS", "5")),
+            max_queue=int(os.getenv("CHAT_MAX_QUEUE_PER_TENANT", "50")),
+        ),
+        business_rate=float(os.getenv("CHAT_RATE_PER_MINUTE", "60")),
+        business_burst=float(os.getenv("CHAT_RATE_BURST", "20")),
+        ip_rate=float(os.getenv("CHAT_IP_RATE_PER_MINUTE", "20")),
+        ip_burst=float(os.getenv("CHAT_IP_RATE_BURST", "10")),
+    )
+
+
+chat_admission = create_admission_from_env()
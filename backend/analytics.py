@@ -0,0 +1,477 @@
+# analytics.py
+import argparse
+import hashlib
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, time, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import Date, bindparam, cast, func, or_, select
+from sqlalchemy.orm import Session
+
+import models
+from archive import ArchiveAggregate, aggregate_archive, archived_files, outside_archived
+from classifier import DEFAULT_CATEGORIES, DEFAULT_CATEGORY, DEFAULT_SENTIMENT, MessageClassifier, classifier_for
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ("hour", "day", "week", "month")
+UNCATEGORIZED = "uncategorized"
+
+_SQLITE_BUCKETS = {
+    "hour": lambda column: func.strftime("%Y-%m-%dT%H:00:00", column),
+    "day": lambda column: func.strftime("%Y-%m-%dT00:00:00", column),
+    "week": lambda column: func.strftime("%Y-%m-%dT00:00:00", column, "weekday 0", "-6 days"),
+    "month": lambda column: func.strftime("%Y-%m-01T00:00:00", column),
+}
+
+
+def bucket_expression(db: Session, column, bucket: str):
+    """SQL expression truncating ``column`` to the start of its hour/day/week/month (weeks start Monday)."""
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unsupported bucket: {bucket}")
+    if db.get_bind().dialect.name == "sqlite":
+        return _SQLITE_BUCKETS[bucket](column)
+    return func.date_trunc(bucket, column)
+
+
+def _day_expression(db: Session, column):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+def _average(sentiment_sum, count) -> float:
+    # Messages without a score count as neutral, as the dashboard always has
+    return float(sentiment_sum or 0) / count if count else 0
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored timestamps and rollup days are UTC without tzinfo
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _is_day_aligned(value: Optional[datetime]) -> bool:
+    return value is None or value.time() == time(0)
+
+
+def chat_analysis(
+    db: Session,
+    business_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: Optional[str] = None,
+    top_n: int = 5
+) -> dict:
+    """Aggregate a business's chat interactions in the database.
+
+    Returns total count, the ``top_n`` categories and the average sentiment for
+    ``start <= timestamp < end``, plus a per-bucket time series when ``bucket``
+    is given. Timezone-aware bounds are converted to UTC first. Whole-day (UTC)
+    queries are answered from the daily rollup table; hourly buckets and bounds
+    inside a day fall back to the raw interactions, merged with any archived
+    interactions in range.
+    """
+    start, end = _naive_utc(start), _naive_utc(end)
+    if bucket != "hour" and _is_day_aligned(start) and _is_day_aligned(end):
+        return _rollup_analysis(db, business_id, start, end, bucket, top_n)
+    return _raw_analysis(db, business_id, start, end, bucket, top_n)
+
+
+def _rollup_analysis(db, business_id, start, end, bucket, top_n) -> dict:
+    rollup = models.ChatAnalyticsDaily
+    filters = [rollup.business_profile_id == business_id]
+    if start is not None:
+        filters.append(rollup.day >= start.date())
+    if end is not None:
+        filters.append(rollup.day < end.date())
+
+    total_queries, sentiment_sum = db.query(
+        func.coalesce(func.sum(rollup.message_count), 0),
+        func.sum(rollup.sentiment_sum)
+    ).filter(*filters).one()
+
+    category_count = func.sum(rollup.message_count)
+    top_categories = db.query(rollup.category, category_count).filter(*filters) \
+        .group_by(rollup.category) \
+        .order_by(category_count.desc(), rollup.category) \
+        .limit(top_n) \
+        .all()
+
+    result = {
+        "total_queries": total_queries,
+        "top_categories": [{"category": name, "count": count} for name, count in top_categories],
+        "average_sentiment": _average(sentiment_sum, total_queries),
+    }
+
+    if bucket:
+        period = bucket_expression(db, rollup.day, bucket).label("bucket")
+        rows = db.query(period, func.sum(rollup.message_count), func.sum(rollup.sentiment_sum)) \
+            .filter(*filters) \
+            .group_by(period) \
+            .order_by(period) \
+            .all()
+        result["series"] = _series(rows)
+
+    return result
+
+
+def _raw_analysis(db, business_id, start, end, bucket, top_n) -> dict:
+    interaction = models.ChatInteraction
+    filters = [interaction.business_profile_id == business_id]
+    if start is not None:
+        filters.append(interaction.timestamp >= start)
+    if end is not None:
+        filters.append(interaction.timestamp < end)
+
+    files = archived_files(db, business_id, start, end)
+    archived = aggregate_archive(files, start, end, bucket) if files else None
+    if files:
+        filters.append(outside_archived(interaction.timestamp, files))
+
+    total_queries, sentiment_sum = db.query(
+        func.count(interaction.id),
+        func.sum(interaction.sentiment_score)
+    ).filter(*filters).one()
+
+    category = func.coalesce(func.nullif(interaction.category, ""), UNCATEGORIZED)
+    category_count = func.count(interaction.id)
+    top_categories = db.query(category, category_count).filter(*filters) \
+        .group_by(category) \
+        .order_by(category_count.desc(), category) \
+        .limit(None if archived else top_n) \
+        .all()
+
+    if archived:
+        total_queries += archived.count
+        sentiment_sum = (sentiment_sum or 0) + archived.sentiment_sum
+        top_categories = _merge_categories(top_categories, archived, top_n)
+
+    result = {
+        "total_queries": total_queries,
+        "top_categories": [{"category": name, "count": count} for name, count in top_categories],
+        "average_sentiment": _average(sentiment_sum, total_queries),
+    }
+
+    if bucket:
+        period = bucket_expression(db, interaction.timestamp, bucket).label("bucket")
+        rows = db.query(period, func.count(interaction.id), func.sum(interaction.sentiment_score)) \
+            .filter(*filters) \
+            .group_by(period) \
+            .order_by(period) \
+            .all()
+        if archived:
+            rows = _merge_series(db, rows, archived)
+        result["series"] = _series(rows)
+
+    return result
+
+
+def _merge_categories(rows, archived: ArchiveAggregate, top_n: int) -> list:
+    counts = dict(rows)
+    for name, count in archived.categories.items():
+        name = name or UNCATEGORIZED
+        counts[name] = counts.get(name, 0) + count
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top_n]
+
+
+def _merge_series(db: Session, rows, archived: ArchiveAggregate) -> list:
+    # Archive periods are UTC datetimes; SQLite buckets are naive ISO strings
+    sqlite = db.get_bind().dialect.name == "sqlite"
+    totals = {period: [count, sentiment_sum or 0] for period, count, sentiment_sum in rows}
+    for period, (count, sentiment_sum) in archived.series.items():
+        if sqlite:
+            period = period.replace(tzinfo=None).isoformat()
+        total = totals.setdefault(period, [0, 0])
+        total[0] += count
+        total[1] += sentiment_sum
+    return [(period, count, sentiment_sum) for period, (count, sentiment_sum) in sorted(totals.items())]
+
+
+def _series(rows) -> List[dict]:
+    return [
+        {
+            "bucket": period.isoformat() if hasattr(period, "isoformat") else str(period),
+            "count": count,
+            "average_sentiment": _average(sentiment_sum, count),
+        }
+        for period, count, sentiment_sum in rows
+    ]
+
+
+def _upsert_rollups(db: Session, rows: List[dict]):
+    table = models.ChatAnalyticsDaily.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Rollup upserts are not implemented for {dialect}")
+
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.business_profile_id, table.c.day, table.c.category],
+        set_={
+            "message_count": table.c.message_count + statement.excluded.message_count,
+            "sentiment_sum": table.c.sentiment_sum + statement.excluded.sentiment_sum,
+            "sentiment_count": table.c.sentiment_count + statement.excluded.sentiment_count,
+        }
+    )
+    db.execute(statement, rows)
+
+
+def apply_rollups(db: Session, interactions: Iterable[dict]):
+    """Add freshly recorded chat_interactions rows to the daily rollups (caller commits)."""
+    totals = defaultdict(lambda: [0, 0.0, 0])
+    for interaction in interactions:
+        key = (
+            interaction["business_profile_id"],
+            interaction["timestamp"].date(),
+            interaction.get("category") or UNCATEGORIZED,
+        )
+        total = totals[key]
+        total[0] += 1
+        if interaction.get("sentiment_score") is not None:
+            total[1] += interaction["sentiment_score"]
+            total[2] += 1
+    if totals:
+        _upsert_rollups(db, [
+            {
+                "business_profile_id": business_id,
+                "day": day,
+                "category": category,
+                "message_count": count,
+                "sentiment_sum": sentiment_sum,
+                "sentiment_count": sentiment_count,
+            }
+            for (business_id, day, category), (count, sentiment_sum, sentiment_count) in totals.items()
+        ])
+
+
+def backfill_rollups(db: Session, business_id: Optional[int] = None, until: Optional[date] = None) -> int:
+    """Rebuild the daily rollups from chat_interactions for every day before ``until`` (default: today, UTC).
+
+    The current day is left alone because the chat writer is still adding to it.
+    Runs in a single transaction; returns the number of rollup rows written.
+    """
+    until = until or datetime.utcnow().date()
+    interaction = models.ChatInteraction
+    rollup = models.ChatAnalyticsDaily
+
+    # Days already archived have no raw rows left to rebuild from, so their rollups are kept
+    archived_until = select(func.max(models.ChatArchiveFile.window_end)) \
+        .where(models.ChatArchiveFile.business_profile_id == rollup.business_profile_id) \
+        .scalar_subquery()
+    stale = db.query(rollup).filter(
+        rollup.day < until,
+        or_(archived_until.is_(None), rollup.day >= _day_expression(db, archived_until))
+    )
+    if business_id is not None:
+        stale = stale.filter(rollup.business_profile_id == business_id)
+    stale.delete(synchronize_session=False)
+
+    day = _day_expression(db, interaction.timestamp)
+    category = func.coalesce(func.nullif(interaction.category, ""), UNCATEGORIZED)
+    source = db.query(
+        interaction.business_profile_id,
+        day,
+        category,
+        func.count(interaction.id),
+        func.coalesce(func.sum(interaction.sentiment_score), 0),
+        func.count(interaction.sentiment_score)
+    ).filter(interaction.timestamp < datetime.combine(until, time(0)))
+    if business_id is not None:
+        source = source.filter(interaction.business_profile_id == business_id)
+    source = source.group_by(interaction.business_profile_id, day, category)
+
+    result = db.execute(rollup.__table__.insert().from_select(
+        ["business_profile_id", "day", "category", "message_count", "sentiment_sum", "sentiment_count"],
+        source.subquery().select()
+    ))
+    db.commit()
+    return result.rowcount
+
+
+def _business_rules(db: Session, business_ids: Iterable[int]) -> Dict[int, Optional[dict]]:
+    """``classification_rules`` of the businesses that still exist (None: the defaults)."""
+    rows = db.query(models.BusinessProfile.id, models.ChatbotConfig.classification_rules) \
+        .outerjoin(models.ChatbotConfig, models.ChatbotConfig.user_id == models.BusinessProfile.user_id) \
+        .filter(models.BusinessProfile.id.in_(list(business_ids))) \
+        .all()
+    return dict(rows)
+
+
+def reclassify_interactions(
+    db: Session,
+    business_id: Optional[int] = None,
+    batch_size: int = 1000,
+    start_after: int = 0,
+    on_batch: Optional[Callable[[int, int, int], None]] = None,
+    rules_used: Optional[Dict[int, Optional[dict]]] = None
+) -> int:
+    """Recompute category and sentiment_score on stored chat_interactions with the current rules.
+
+    Walks the table in id order, ``batch_size`` rows at a time (keyset
+    pagination, so memory stays flat and each batch is its own short
+    transaction), and writes back only the rows whose values changed with one
+    executemany UPDATE per batch. After every committed batch ``on_batch`` gets
+    ``(last_id, scanned, updated)``; pass ``last_id`` back as ``start_after`` to
+    resume. ``rules_used``, if given, is filled with the ``classification_rules``
+    of every business classified so far. Returns the number of rows updated.
+    Rollups are not touched; run ``backfill_rollups`` afterwards.
+    """
+    table = models.ChatInteraction.__table__
+    update = table.update() \
+        .where(table.c.id == bindparam("row_id")) \
+        .values(category=bindparam("new_category"), sentiment_score=bindparam("new_sentiment"))
+    classifiers: Dict[int, MessageClassifier] = {}
+    last_id, scanned, updated = start_after, 0, 0
+
+    while True:
+        query = select(table.c.id, table.c.business_profile_id, table.c.user_message,
+                       table.c.category, table.c.sentiment_score) \
+            .where(table.c.id > last_id) \
+            .order_by(table.c.id) \
+            .limit(batch_size)
+        if business_id is not None:
+            query = query.where(table.c.business_profile_id == business_id)
+        rows = db.execute(query).all()
+        if not rows:
+            break
+
+        missing = {row.business_profile_id for row in rows} - classifiers.keys()
+        if missing:
+            found = _business_rules(db, missing)
+            for business in missing:
+                classifiers[business] = classifier_for(found.get(business))
+                if rules_used is not None:
+                    rules_used[business] = found.get(business)
+
+        by_business = defaultdict(list)
+        for row in rows:
+            by_business[row.business_profile_id].append(row)
+        changes = []
+        for business, business_rows in by_business.items():
+            results = classifiers[business].classify_batch([row.user_message or "" for row in business_rows])
+            for row, (category, sentiment) in zip(business_rows, results):
+                if category != row.category or sentiment != row.sentiment_score:
+                    changes.append({"row_id": row.id, "new_category": category, "new_sentiment": sentiment})
+        if changes:
+            db.execute(update, changes)
+        db.commit()
+
+        last_id = rows[-1].id
+        scanned += len(rows)
+        updated += len(changes)
+        if on_batch:
+            on_batch(last_id, scanned, updated)
+
+    return updated
+
+
+def rules_fingerprint(rules) -> str:
+    """Short stable hash of classification rules (any JSON-serializable value)."""
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+DEFAULT_RULES_FINGERPRINT = rules_fingerprint([DEFAULT_CATEGORIES, DEFAULT_SENTIMENT, DEFAULT_CATEGORY])
+
+
+def _read_checkpoint(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_checkpoint(path: str, checkpoint: dict):
+    # Write-then-rename so an interrupted run never leaves a torn checkpoint
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+def _checkpoint_conflict(db: Session, checkpoint: dict, business_id: Optional[int]) -> Optional[str]:
+    """Why ``checkpoint`` can't be resumed with the current rules, or None if it can.
+
+    Only businesses the interrupted run already classified are compared, so
+    businesses signed up since then don't block the resume, nor do ones
+    deleted since.
+    """
+    if "businesses" not in checkpoint:
+        return "it does not record the rules it was written with"
+    if checkpoint.get("business_id") != business_id:
+        return "it was written for another --business-id"
+    if checkpoint.get("defaults") != DEFAULT_RULES_FINGERPRINT:
+        return "the default classification rules changed"
+    processed = {int(business): fingerprint for business, fingerprint in checkpoint["businesses"].items()}
+    changed = [
+        business for business, rules in _business_rules(db, processed).items()
+        if rules_fingerprint(rules) != processed[business]
+    ]
+    if changed:
+        return f"the classification rules of business {', '.join(map(str, sorted(changed)))} changed"
+    return None
+
+
+def main():
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Chat analytics maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="Rebuild daily rollups from chat_interactions")
+    backfill.add_argument("--business-id", type=int, help="Only rebuild this business")
+    backfill.add_argument("--until", type=date.fromisoformat, help="Rebuild days before this date (default: today, UTC)")
+    reclassify = commands.add_parser("reclassify", help="Recompute category and sentiment on stored chat_interactions")
+    reclassify.add_argument("--business-id", type=int, help="Only reclassify this business")
+    reclassify.add_argument("--batch-size", type=int, default=1000)
+    reclassify.add_argument("--checkpoint", default="reclassify.checkpoint.json",
+                            help="File recording the last processed id and the rules used; an existing "
+                                 "checkpoint is resumed from unless those rules changed")
+    reclassify.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        if args.command == "backfill":
+            rows = backfill_rollups(db, business_id=args.business_id, until=args.until)
+            logger.info("Wrote %s rollup rows", rows)
+        elif args.command == "reclassify":
+            checkpoint = None if args.restart else _read_checkpoint(args.checkpoint)
+            if checkpoint is not None:
+                conflict = _checkpoint_conflict(db, checkpoint, args.business_id)
+                if conflict:
+                    parser.error(f"can't resume {args.checkpoint}: {conflict}; "
+                                 "pass --restart to start over or --checkpoint to use another file")
+            start_after = checkpoint["last_id"] if checkpoint else 0
+            rules_used = _business_rules(db, [int(business) for business in checkpoint["businesses"]]) \
+                if checkpoint else {}
+            max_id = db.query(func.max(models.ChatInteraction.id)).scalar() or 0
+            if start_after:
+                logger.info("Resuming after id %s", start_after)
+
+            def progress(last_id, scanned, updated):
+                _write_checkpoint(args.checkpoint, {
+                    "last_id": last_id,
+                    "business_id": args.business_id,
+                    "defaults": DEFAULT_RULES_FINGERPRINT,
+                    "businesses": {business: rules_fingerprint(rules) for business, rules in rules_used.items()},
+                })
+                logger.info("id %s/%s (%.1f%%): scanned %s, updated %s",
+                            last_id, max_id, 100 * last_id / max_id if max_id else 100, scanned, updated)
+
+            updated = reclassify_interactions(db, business_id=args.business_id, batch_size=args.batch_size,
+                                              start_after=start_after, on_batch=progress, rules_used=rules_used)
+            logger.info("Reclassified %s interactions; run 'backfill' to refresh the daily rollups", updated)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
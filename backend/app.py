@@ -1,21 +1,39 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
-from passlib.context import CryptContext
 import models
-from database import SessionLocal, engine
+from database import SessionLocal, AsyncSessionLocal, async_engine, engine
 from pydantic import BaseModel, EmailStr, Field
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 import os
+import json
+from contextlib import aclosing
 from dotenv import load_dotenv
-from schemas import BusinessProfileCreate, ChatbotConfigCreate, ChatAnalysisResponse
-from typing import Optional, List
-from chatbot import GeminiCompanyBot
+from schemas import BusinessProfileCreate, ChatbotConfigCreate, ChatHistoryPage, FAQCreate, FAQResponse
+from typing import Callable, Optional, List
 from general_chatbot import GeminiGeneralBot
+from bot_registry import bot_registry
+from response_cache import normalize_message, response_cache
+from faq_index import faq_indexes
+from chat_writer import chat_writer
+from user_cache import CurrentUser, user_cache
+from analytics import chat_analysis
+from chat_history import InvalidCursor, csv_lines, export_rows, history_page, ndjson_lines
+from llm_backends import get_llm_backend
+from passwords import password_hasher
+from classifier import classifier_for
+from sessions import InMemorySessionStore, new_session_id, session_store
+from singleflight import chat_flights
+from admission import Rejected, chat_admission
+from metrics import CHAT_ANSWERS, CHAT_STAGE_SECONDS, MetricsMiddleware, registry
+from profiling import ProfilingMiddleware, instrument_engines, profiling_options_from_env
+from mailer import mail_dispatcher
+from purge import account_purger, mark_business_deleted, mark_user_deleted
 
 
 # Load environment variables
@@ -34,27 +52,76 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+# On-demand request profiling (X-Profile header / PROFILE_SAMPLE_RATE) and per-request SQL stats
+profiling_options = profiling_options_from_env()
+if profiling_options["token"] or profiling_options["sample_rate"] or profiling_options["log_sql"]:
+    instrument_engines([engine, async_engine])
+    app.add_middleware(ProfilingMiddleware, **profiling_options)
+
+@app.on_event("startup")
+async def start_background_writers():
+    chat_writer.start()
+    mail_dispatcher.start()
+    account_purger.start()
+
+@app.on_event("shutdown")
+async def drain_background_writers():
+    await chat_writer.stop()
+    await mail_dispatcher.stop()
+    await account_purger.stop()
+    password_hasher.shutdown()
+
+@app.exception_handler(Rejected)
+async def admission_rejected(request: Request, exc: Rejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def runtime_metrics():
+    """Gauges and counters read at scrape time from the components that already track them"""
+    backend = get_llm_backend()
+    yield "llm_in_flight", "gauge", "LLM calls in progress", backend.in_flight, None
+    yield "llm_waiting", "gauge", "LLM calls waiting for a concurrency slot", backend.waiting, None
+    for name, value in response_cache.stats().items():
+        kind = "gauge" if name == "size" else "counter"
+        yield f"response_cache_{name}" + ("" if kind == "gauge" else "_total"), kind, f"Response cache {name}", value, None
+    yield "chat_flights_coalesced_total", "counter", "Chat requests that shared another request's LLM call", chat_flights.coalesced, None
+    yield "chat_admission_active", "gauge", "Admitted LLM-bound chat requests in progress", chat_admission.scheduler.active, None
+    yield "chat_admission_waiting", "gauge", "Chat requests queued for a slot", chat_admission.scheduler.waiting, None
+    yield "chat_admission_rejected_total", "counter", "Chat requests rejected", chat_admission.scheduler.rejected, {"reason": "overloaded"}
+    yield "chat_admission_rejected_total", "counter", "Chat requests rejected", chat_admission.limited, {"reason": "rate_limited"}
+    yield "chat_writer_queue_depth", "gauge", "Chat interactions waiting to be written", chat_writer.depth, None
+    yield "chat_writer_written_total", "counter", "Chat interactions written", chat_writer.written, None
+    yield "chat_writer_dropped_total", "counter", "Chat interactions dropped after retries", chat_writer.dropped, None
+    yield "chat_writer_discarded_total", "counter", "Chat interactions of deleted businesses or rejected by the database", chat_writer.discarded, None
+    yield "mail_queue_depth", "gauge", "Emails waiting to be sent", mail_dispatcher.depth, None
+    yield "mail_sent_total", "counter", "Emails sent", mail_dispatcher.sent, None
+    yield "mail_failed_total", "counter", "Emails given up on after retries", mail_dispatcher.failed, None
+    yield "account_purge_queue_depth", "gauge", "Deleted accounts and profiles waiting to be purged", account_purger.depth, None
+    yield "account_purges_total", "counter", "Account and profile purges", account_purger.purged, {"result": "done"}
+    yield "account_purges_total", "counter", "Account and profile purges", account_purger.failed, {"result": "failed"}
+    hasher = password_hasher.stats()
+    yield "password_hash_waiting", "gauge", "Password hashes waiting for a worker slot", hasher["waiting"], None
+    yield "password_hash_pending", "gauge", "Password hashes running on the worker pool", hasher["pending"], None
+    if isinstance(session_store, InMemorySessionStore):
+        yield "chat_sessions", "gauge", "Conversation sessions held in memory", len(session_store), None
+
+registry.add_collector(runtime_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text-format metrics for this worker process"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY")  # Get from environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Email configuration
-mail_conf = ConnectionConfig(
-    MAIL_USERNAME = os.getenv("MAIL_USERNAME"),
-    MAIL_PASSWORD = os.getenv("MAIL_PASSWORD"),
-    MAIL_FROM = os.getenv("MAIL_FROM"),
-    MAIL_PORT = 587,
-    MAIL_SERVER = "smtp.gmail.com",
-    MAIL_STARTTLS = True,
-    MAIL_SSL_TLS = False,
-    USE_CREDENTIALS = True
-)
-
 # Pydantic models
 class UserCreate(BaseModel):
     email: EmailStr
@@ -71,8 +138,23 @@ class Token(BaseModel):
 
 class ChatMessage(BaseModel):
     message: str
+    session_id: Optional[str] = Field(None, max_length=64)  # Returned by the first reply; send it back to continue
 
 
+def invalidate_bot(business_id: Optional[int]):
+    """Drop the warm bot (whose prompt chunks include the FAQs) and its cached answers"""
+    if business_id is None:
+        return
+    response_cache.invalidate(business_id)
+    bot_registry.invalidate(business_id)
+
+def invalidate_business(business_id: Optional[int]):
+    """Drop every in-process cache derived from a business's profile or config"""
+    if business_id is None:
+        return
+    invalidate_bot(business_id)
+    faq_indexes.invalidate(business_id)
+
 # Database dependency
 def get_db():
     db = SessionLocal()
@@ -81,6 +163,10 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Token creation functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -104,10 +190,10 @@ def create_verification_token(email: str) -> str:
 async def send_verification_email(email: str, verification_token: str):
     verify_url = f"http://localhost:8000/verify/{verification_token}"
     
-    message = MessageSchema(
-        subject="Verify your email",
-        recipients=[email],
-        body=f"""
+    await mail_dispatcher.enqueue(
+        email,
+        "Verify your email",
+        f"""
         <html>
             <body>
                 <h1>Email Verification</h1>
@@ -118,12 +204,8 @@ async def send_verification_email(email: str, verification_token: str):
                 <p>If you didn't request this verification, please ignore this email.</p>
             </body>
         </html>
-        """,
-        subtype="html"
+        """
     )
-    
-    fm = FastMail(mail_conf)
-    await fm.send_message(message)
 
 @app.post("/api/register", response_model=dict)
 async def register_user(user: UserCreate, db: Session = Depends(get_db)):
@@ -136,7 +218,7 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     verification_token = create_verification_token(user.email)
     
     # Create new user
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -151,7 +233,7 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(db_user)
         
-        # Send verification email
+        # Queue the verification email; the dispatcher sends it in the background
         await send_verification_email(user.email, verification_token)
         
         return {"message": "Registration successful. Please check your email to verify your account."}
@@ -196,9 +278,12 @@ def create_verification_token(email: str) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 @app.post("/api/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
     # Find user
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    result = await db.execute(
+        select(models.User).filter(models.User.email == user.email, models.User.deleted_at.is_(None))
+    )
+    db_user = result.scalars().first()
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -206,13 +291,19 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not pwd_context.verify(user.password, db_user.hashed_password):
+    verified, new_hash = await password_hasher.verify_and_update(user.password, db_user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Transparently upgrade hashes made with a different bcrypt cost
+    if new_hash:
+        db_user.hashed_password = new_hash
+        await db.commit()
+    
     if not db_user.is_verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -231,7 +322,7 @@ from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -246,13 +337,32 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
      raise credentials_exception
 
     
-    user = db.query(models.User).filter(models.User.email == email).first()
+    cached_user = user_cache.get(email)
+    if cached_user is not None:
+        return cached_user
+
+    # Load the profile and config in the same query instead of lazily per attribute
+    result = await db.execute(
+        select(models.User)
+        .options(joinedload(models.User.business_profile), joinedload(models.User.chatbot_config))
+        .filter(models.User.email == email, models.User.deleted_at.is_(None))
+    )
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
+    current_user = CurrentUser.from_model(user)
+    user_cache.set(current_user)
+    return current_user
+
+def get_db_user(db: Session, current_user: CurrentUser) -> models.User:
+    """Load the authenticated user into the request's sync session so it can be modified"""
+    user = db.query(models.User).get(current_user.id)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
     return user
 
 @app.get("/api/user/profile")
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: CurrentUser = Depends(get_current_user)):
     return {
         "email": current_user.email,
         "company_name": current_user.company_name,
@@ -260,30 +370,37 @@ async def read_users_me(current_user: models.User = Depends(get_current_user)):
     }
 
 @app.delete("/api/user/delete", status_code=204)
-async def delete_user(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def delete_user(current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Deactivate the account now; its data is purged in the background"""
     try:
-        db.delete(current_user)
+        mark_user_deleted(db, current_user.id)
         db.commit()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete user: {str(e)}") 
+        raise HTTPException(status_code=500, detail=f"Failed to delete user: {str(e)}")
+    invalidate_business(current_user.business_profile_id)
+    user_cache.invalidate(current_user.email)
+    if current_user.business_profile_id is not None:
+        account_purger.enqueue("business", current_user.business_profile_id)
+    account_purger.enqueue("user", current_user.id)
     
 @app.delete("/api/user/business-profile", status_code=204)
-async def delete_business_profile(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Delete the user's business profile"""
-    if current_user.business_profile:
-        try:
-            db.delete(current_user.business_profile)
-            db.commit()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to delete business profile: {str(e)}")
-    else:
-        raise HTTPException(status_code=404, detail="Business profile not found")
+async def delete_business_profile(current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Delete the user's business profile; its FAQs and chat history are purged in the background"""
+    business_id = get_user_business_id(current_user)
+    try:
+        mark_business_deleted(db, business_id)
+        db.commit()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete business profile: {str(e)}")
+    invalidate_business(business_id)
+    user_cache.invalidate(current_user.email)
+    account_purger.enqueue("business", business_id)
 
 @app.get("/api/user/complete-profile")
-async def get_complete_profile(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_complete_profile(current_user: CurrentUser = Depends(get_current_user)):
     """Get complete user profile including business profile and chatbot config"""
-    business_profile = current_user.business_profile
-    chatbot_config = current_user.chatbot_config
+    business_profile = dict(current_user.business_profile) if current_user.business_profile else None
+    chatbot_config = dict(current_user.chatbot_config) if current_user.chatbot_config else None
     
     return {
         "user": {
@@ -300,210 +417,416 @@ async def get_complete_profile(current_user: models.User = Depends(get_current_u
 async def create_business_profile(
     profile: BusinessProfileCreate,
     config: ChatbotConfigCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create or update business profile and chatbot config"""
-    if current_user.business_profile:
+    user = get_db_user(db, current_user)
+    if user.business_profile:
          # Update existing profile
         for key, value in profile.dict().items():
-             setattr(current_user.business_profile, key, value)
+             setattr(user.business_profile, key, value)
     else:
        # Create new profile
-       db_profile = models.BusinessProfile(**profile.dict(), user_id=current_user.id)
+       db_profile = models.BusinessProfile(**profile.dict(), user_id=user.id)
        db.add(db_profile)
 
 
-    if current_user.chatbot_config:
+    if user.chatbot_config:
          # Update existing config
          for key, value in config.dict().items():
-             setattr(current_user.chatbot_config, key, value)
+             setattr(user.chatbot_config, key, value)
     else:
         # Create new config
-       db_config = models.ChatbotConfig(**config.dict(), user_id = current_user.id)
+       db_config = models.ChatbotConfig(**config.dict(), user_id = user.id)
        db.add(db_config)
 
     db.commit()
+    db.refresh(user)
+    invalidate_business(user.business_profile.id)
+    user_cache.invalidate(user.email)
     return {"message": "Business profile and Chatbot config updated successfully"}
 
 @app.put("/api/user/business-profile")
 async def update_business_profile(
        profile: BusinessProfileCreate,
        config: ChatbotConfigCreate,
-       current_user: models.User = Depends(get_current_user),
+       current_user: CurrentUser = Depends(get_current_user),
        db: Session = Depends(get_db)
    ):
       """Update existing business profile"""
-      if not current_user.business_profile:
+      user = get_db_user(db, current_user)
+      if not user.business_profile:
           raise HTTPException(status_code=404, detail="Business profile not found")
 
      
       for key, value in profile.dict().items():
-        setattr(current_user.business_profile, key, value)
+        setattr(user.business_profile, key, value)
    
-      if not current_user.chatbot_config:
+      if not user.chatbot_config:
          raise HTTPException(status_code=404, detail="Chatbot config not found")
 
       for key, value in config.dict().items():
-           setattr(current_user.chatbot_config, key, value)
+           setattr(user.chatbot_config, key, value)
       db.commit()
+      invalidate_business(user.business_profile.id)
+      user_cache.invalidate(user.email)
 
       return {"message": "Business profile and Chatbot config updated successfully"}
 
+def get_user_business_id(current_user: CurrentUser) -> int:
+    if not current_user.business_profile:
+        raise HTTPException(status_code=404, detail="Business profile not found")
+    return current_user.business_profile_id
+
+def get_user_faq(faq_id: int, current_user: CurrentUser, db: Session) -> models.FAQ:
+    business_id = get_user_business_id(current_user)
+    faq = db.query(models.FAQ).filter(
+        models.FAQ.id == faq_id,
+        models.FAQ.business_profile_id == business_id
+    ).first()
+    if not faq:
+        raise HTTPException(status_code=404, detail="FAQ not found")
+    return faq
+
+@app.get("/api/user/faqs", response_model=List[FAQResponse])
+async def list_faqs(current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """List the active FAQs of the user's business"""
+    business_id = get_user_business_id(current_user)
+    return db.query(models.FAQ).filter(
+        models.FAQ.business_profile_id == business_id,
+        models.FAQ.is_active == True
+    ).order_by(models.FAQ.priority.desc(), models.FAQ.id).all()
+
+@app.post("/api/user/faqs", response_model=FAQResponse)
+async def create_faq(
+    faq: FAQCreate,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Add an FAQ to the user's business"""
+    business_id = get_user_business_id(current_user)
+    db_faq = models.FAQ(**faq.dict(), business_profile_id=business_id, is_active=True)
+    db.add(db_faq)
+    db.commit()
+    db.refresh(db_faq)
+    faq_indexes.upsert(db_faq)
+    invalidate_bot(db_faq.business_profile_id)
+    return db_faq
+
+@app.put("/api/user/faqs/{faq_id}", response_model=FAQResponse)
+async def update_faq(
+    faq_id: int,
+    faq: FAQCreate,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update one of the user's FAQs"""
+    db_faq = get_user_faq(faq_id, current_user, db)
+    for key, value in faq.dict().items():
+        setattr(db_faq, key, value)
+    db.commit()
+    db.refresh(db_faq)
+    faq_indexes.upsert(db_faq)
+    invalidate_bot(db_faq.business_profile_id)
+    return db_faq
+
+@app.delete("/api/user/faqs/{faq_id}", status_code=204)
+async def delete_faq(faq_id: int, current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Deactivate one of the user's FAQs"""
+    db_faq = get_user_faq(faq_id, current_user, db)
+    db_faq.is_active = False
+    db.commit()
+    faq_indexes.remove(db_faq.business_profile_id, db_faq.id)
+    invalidate_bot(db_faq.business_profile_id)
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, default=str)}\n\n"
+
+async def single_chunk(text: str):
+    yield text
+
+class SSEResponse(StreamingResponse):
+    """StreamingResponse that always closes its body and calls ``release`` once the response is over,
+    including when the client disconnects early or the body is never read"""
+
+    def __init__(self, content, release: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                if self.release:
+                    self.release()
+
+def stream_sse(chunks, on_complete, release: Optional[Callable[[], None]] = None):
+    """Relay response chunks as SSE `delta` events, then a final `done` event built by on_complete(full_response)"""
+    async def events():
+        parts = []
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield sse_event({"delta": chunk})
+        yield sse_event(await on_complete("".join(parts)), event="done")
+
+    return SSEResponse(
+        events(),
+        release=release,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def client_ip(request: Request) -> Optional[str]:
+    return request.client.host if request.client else None
+
+def release_once(release: Callable[[], None]) -> Callable[[], None]:
+    """Wrap ``release`` so only its first call has an effect"""
+    released = False
+
+    def once():
+        nonlocal released
+        if not released:
+            released = True
+            release()
+    return once
+
+async def hold_slot(chunks, release):
+    """Relay a response stream, giving back its admission slot once the stream ends"""
+    try:
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                yield chunk
+    finally:
+        release()
+
+async def admitted(tenant: str, call):
+    """Run an LLM-bound call inside one of the tenant's fairly shared slots"""
+    async with chat_admission.slot(tenant):
+        return await call()
+
+async def record_chat_interaction(business_id: int, chatbot_config, message: str, response: str):
+    """Classify the message and queue the interaction for storage if chat history is enabled"""
+    # Classify Request
+    with CHAT_STAGE_SECONDS.labels("classification").time():
+        category, sentiment_score = classifier_for(chatbot_config.get('classification_rules')).classify(message)
+
+    # Store interaction if enabled
+    if chatbot_config['save_chat_history']:
+        with CHAT_STAGE_SECONDS.labels("persistence").time():
+            await chat_writer.enqueue({
+                "business_profile_id": business_id,
+                "user_message": message,
+                "bot_response": response,
+                "timestamp": datetime.utcnow(),
+                "category": category,
+                "sentiment_score": sentiment_score
+            })
+
 @app.post("/api/chat/{business_id}")
 async def chat_endpoint(
     business_id: int,
     chat_message: ChatMessage,
-    db: Session = Depends(get_db)
+    request: Request,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Handle chat interactions for a specific business"""
-    # Get business profile and config
+    # Get warm business profile, config and bot
     message = chat_message.message
-    business_profile = db.query(models.BusinessProfile).filter(
-        models.BusinessProfile.id == business_id
-    ).first()
+    with CHAT_STAGE_SECONDS.labels("lookup").time():
+        entry = await bot_registry.get(db, business_id)
     
-    if not business_profile:
+    if not entry:
         raise HTTPException(status_code=404, detail="Business not found")
     
-    chatbot_config = db.query(models.ChatbotConfig).filter(
-        models.ChatbotConfig.user_id == business_profile.user_id
-    ).first()
+    tenant = str(business_id)
+    await chat_admission.check(tenant, client_ip(request), entry.config)
+
+    chatbot_config = entry.config
 
     if not chatbot_config:
+           CHAT_ANSWERS.labels("fallback").inc()
            return {
-               "business_name": business_profile.business_name,
+               "business_name": entry.business_name,
                "message": message,
               "response": "Hi there! Thanks for your interest in our business. I'll gladly assist you. However, based on the information provided, I'm unable to share any specific details about our business since the necessary information is missing. Would you like to connect with a human representative to get more information? If so, I can provide you with their contact details.",
               "timestamp": datetime.utcnow().isoformat()
           }
 
-    # Initialize chatbot
-    bot = GeminiCompanyBot(
-        business_profile=business_profile.__dict__,
-        config=chatbot_config.__dict__,
-        api_key=os.getenv("GEMINI_API_KEY")
-    )
-    
-    # Get response
-    response = await bot.get_response(message)
-    
-    # Classify Request
-    category = classify_message(message)
-    sentiment_score = analyze_sentiment(message)
+    session_id = chat_message.session_id or new_session_id()
+    session_key = f"{business_id}:{session_id}"
+    history = await session_store.get(session_key)
+
+    # Answer directly from a matching FAQ without calling the LLM
+    with CHAT_STAGE_SECONDS.labels("faq_match").time():
+        faq_match = await faq_indexes.match(db, business_id, message)
+    # Outside opening hours the configured message is the answer; no LLM call, no scheduler slot
+    out_of_hours = not faq_match and entry.bot.is_out_of_hours()
+    # Cached answers cost nothing, so they are served before queueing for a scheduler slot
+    cached = None if faq_match or out_of_hours or history else entry.bot.cached_response(message)
+    if faq_match:
+        source = "faq"
+    elif out_of_hours:
+        source = "out_of_hours"
+    else:
+        source = "bot" if cached is None else "cache"
+    CHAT_ANSWERS.labels(source).inc()
+
+    if stream:
+        async def on_complete(response: str) -> dict:
+            await session_store.append(session_key, message, response)
+            await record_chat_interaction(business_id, chatbot_config, message, response)
+            return {
+                "business_name": entry.business_name,
+                "message": message,
+                "response": response,
+                "session_id": session_id,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+
+        if faq_match:
+            chunks = single_chunk(faq_match[1])
+        elif out_of_hours:
+            chunks = single_chunk(chatbot_config['out_of_hours_message'])
+        elif cached is not None:
+            chunks = single_chunk(cached)
+        else:
+            await chat_admission.scheduler.acquire(tenant)
+            release = release_once(chat_admission.scheduler.release)
+            chunks = entry.bot.stream_response(message, history, skip_precheck=True)
+            return stream_sse(hold_slot(chunks, release), on_complete, release)
+        return stream_sse(chunks, on_complete)
 
-    # Store interaction if enabled
-    if chatbot_config.save_chat_history:
-        # You'll need to create a ChatInteraction model
-        interaction = models.ChatInteraction(
-            business_profile_id=business_id,
-            user_message=message,
-            bot_response=response,
-            timestamp=datetime.utcnow(),
-             category = category,
-              sentiment_score = sentiment_score
+    # Get response
+    if faq_match:
+        response = faq_match[1]
+    elif out_of_hours:
+        response = chatbot_config['out_of_hours_message']
+    elif cached is not None:
+        response = cached
+    elif history:
+        response = await admitted(tenant, lambda: entry.bot.get_response(message, history, skip_precheck=True))
+    else:
+        # Identical questions asked at the same time share one LLM call (and slot); each is still recorded
+        flight_key = (business_id, response_cache.generation(business_id), normalize_message(message))
+        response = await chat_flights.do(
+            flight_key, lambda: admitted(tenant, lambda: entry.bot.get_response(message, skip_precheck=True))
         )
-        db.add(interaction)
-        db.commit()
+    
+    await session_store.append(session_key, message, response)
+    await record_chat_interaction(business_id, chatbot_config, message, response)
     
     return {
-        "business_name": business_profile.business_name,
+        "business_name": entry.business_name,
         "message": message,
         "response": response,
+        "session_id": session_id,
         "timestamp": datetime.utcnow().isoformat()
     }
 
 @app.post("/api/general-chat")
 async def general_chat_endpoint(
     chat_message: ChatMessage,
+    request: Request,
+    stream: bool = False,
 ):
     """Handle chat interactions for a specific business"""
     message = chat_message.message
+    await chat_admission.check("general", client_ip(request))
+    session_id = chat_message.session_id or new_session_id()
+    session_key = f"general:{session_id}"
+    history = await session_store.get(session_key)
     # Initialize chatbot
     bot = GeminiGeneralBot(
-        api_key=os.getenv("GEMINI_API_KEY")
+        backend=get_llm_backend()
     )
 
+    if stream:
+        async def on_complete(response: str) -> dict:
+            await session_store.append(session_key, message, response)
+            return {
+                "message": message,
+                "response": response,
+                "session_id": session_id,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+
+        await chat_admission.scheduler.acquire("general")
+        release = release_once(chat_admission.scheduler.release)
+        return stream_sse(hold_slot(bot.stream_response(message, history), release), on_complete, release)
+
     # Get response
-    response = await bot.get_response(message)
+    response = await admitted("general", lambda: bot.get_response(message, history))
+    await session_store.append(session_key, message, response)
 
     return {
         "message": message,
         "response": response,
+        "session_id": session_id,
         "timestamp": datetime.utcnow().isoformat()
     }
 
 
 @app.get("/api/user/chat-analysis")
-async def get_user_chat_analysis(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get chat analysis for the current user"""
-    business_profile = current_user.business_profile
+async def get_user_chat_analysis(
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    bucket: Optional[str] = Query(None, pattern="^(hour|day|week|month)$"),
+    top: int = Query(5, ge=1, le=50),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get chat analysis for the current user, optionally limited to [from, to) and bucketed over time"""
+    business_id = get_user_business_id(current_user)
 
-    if not business_profile:
-        raise HTTPException(status_code=404, detail="Business profile not found")
-    
-    interactions = db.query(models.ChatInteraction).filter(
-        models.ChatInteraction.business_profile_id == business_profile.id
-     ).all()
-
-    total_queries = len(interactions)
-
-   # Count query by category
-    category_counts = {}
-    for interaction in interactions:
-         category = interaction.category if interaction.category else "uncategorized"
-         category_counts[category] = category_counts.get(category, 0) + 1
-    sorted_categories = sorted(category_counts.items(), key=lambda item: item[1], reverse=True)
-   # Convert to list of objects
-    top_categories = [{"category": cat, "count": count} for cat, count in sorted_categories]
-     # Limit to top categories
-    top_categories = top_categories[:5]
-    
-    avg_sentiment = 0
-    total_sentiment = 0
-    for interaction in interactions:
-        if interaction.sentiment_score:
-         total_sentiment += interaction.sentiment_score
-     
-    if total_queries > 0:
-       avg_sentiment = total_sentiment / total_queries
+    return await db.run_sync(
+        chat_analysis, business_id, start=from_, end=to, bucket=bucket, top_n=top
+    )
 
 
-    
-    return {
-        "total_queries": total_queries,
-        "top_categories": top_categories,
-        "average_sentiment": avg_sentiment
-    }
+@app.get("/api/user/chat-history", response_model=ChatHistoryPage)
+async def get_user_chat_history(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Page through the current user's chat interactions, newest first; pass next_cursor to continue"""
+    business_id = get_user_business_id(current_user)
 
+    try:
+        return await db.run_sync(history_page, business_id, limit=limit, cursor=cursor, start=from_, end=to)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
-def classify_message(message: str) -> str:
-    message = message.lower()
+@app.get("/api/user/chat-history/export")
+async def export_user_chat_history(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Download every chat interaction in [from, to), oldest first, as NDJSON or CSV"""
+    business_id = get_user_business_id(current_user)
 
-    if "hours" in message or "time" in message:
-        return "hours"
-    elif "location" in message or "address" in message:
-        return "location"
-    elif "payment" in message or "pay" in message or "method" in message:
-        return "payment"
-    elif "services" in message or "offer" in message or "provide" in message:
-        return "services"
+    batches = export_rows(AsyncSessionLocal, business_id, start=from_, end=to)
+    if format == "csv":
+        body, media_type = csv_lines(batches), "text/csv"
     else:
-        return "general"
-
-def analyze_sentiment(message: str) -> float:
-     message = message.lower()
-
-     positive_keywords = ["good", "great", "excellent", "happy", "love", "best"]
-     negative_keywords = ["bad", "terrible", "awful", "unhappy", "hate", "worst"]
-
-     positive_count = sum(1 for keyword in positive_keywords if keyword in message)
-     negative_count = sum(1 for keyword in negative_keywords if keyword in message)
-
-     if positive_count > negative_count:
-        return 1
-     elif negative_count > positive_count:
-        return -1
-     else:
-         return 0
\ No newline at end of file
+        body, media_type = ndjson_lines(batches), "application/x-ndjson"
+    filename = f"chat-history-{business_id}-{datetime.utcnow():%Y%m%d}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
\ No newline at end of file
@@ -0,0 +1,282 @@
+# archive.py
+"""Tiered retention for chat_interactions.
+
+    python archive.py [--business-id 42] [--batch-size 10000]
+
+Interactions older than a business's retention horizon (``retention_days`` on
+its chatbot config, else ``CHAT_RETENTION_DAYS``) are written to zstd-compressed
+Parquet files under ``CHAT_ARCHIVE_DIR``, laid out as
+``business_id=<id>/month=<YYYY-MM>/part-*.parquet``, then deleted from the live
+table in batches. Each file is registered in ``chat_archive_files`` so analytics
+and exports can read it back. Daily rollups are left in place, so whole-day
+analytics never need the archive.
+
+Once a file is registered it is the only source for its window: readers skip
+live rows inside registered windows (see ``outside_archived``), so nothing is
+counted twice or missed while the window is still being purged. The app and
+this job must see the same ``CHAT_ARCHIVE_DIR``.
+"""
+import argparse
+import logging
+import os
+import secrets
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from sqlalchemy import and_, delete, func, not_, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+import models
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Resolved once, so the job, analytics, exports and purges agree whatever their working directory
+ARCHIVE_DIR = os.path.abspath(
+    os.getenv("CHAT_ARCHIVE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_archive")
+)
+DEFAULT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "365"))
+
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),  # naive database values are UTC
+    ("user_message", pa.string()),
+    ("bot_response", pa.string()),
+    ("category", pa.string()),
+    ("sentiment_score", pa.float64()),
+])
+
+
+def _next_month(value: datetime) -> datetime:
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _retention_days(db: Session) -> Dict[int, Optional[int]]:
+    return dict(
+        db.query(models.BusinessProfile.id, models.ChatbotConfig.retention_days)
+        .outerjoin(models.ChatbotConfig, models.ChatbotConfig.user_id == models.BusinessProfile.user_id)
+        .all()
+    )
+
+
+def _purge_window(db: Session, archive_file: models.ChatArchiveFile, batch_size: int) -> int:
+    """Delete an archived window from chat_interactions, committing after every batch to keep locks short."""
+    table = models.ChatInteraction.__table__
+    window = (
+        table.c.business_profile_id == archive_file.business_profile_id,
+        table.c.timestamp >= archive_file.window_start,
+        table.c.timestamp < archive_file.window_end,
+    )
+    deleted = 0
+    while True:
+        batch = select(table.c.id).where(*window).limit(batch_size).scalar_subquery()
+        count = db.execute(delete(table).where(table.c.id.in_(batch))).rowcount
+        db.commit()
+        deleted += count
+        if count < batch_size:
+            break
+    archive_file.purged = True
+    db.commit()
+    return deleted
+
+
+def _write_window(
+    db: Session,
+    business_id: int,
+    window_start: datetime,
+    window_end: datetime,
+    batch_size: int
+) -> models.ChatArchiveFile:
+    table = models.ChatInteraction.__table__
+    columns = [table.c[name] for name in SCHEMA.names]
+    relative = os.path.join(
+        f"business_id={business_id}", f"month={window_start:%Y-%m}",
+        f"part-{window_start:%Y%m%dT%H%M%S}-{secrets.token_hex(4)}.parquet"
+    )
+    path = os.path.join(ARCHIVE_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    rows = 0
+    last_key: Optional[Tuple[datetime, int]] = None
+    with pq.ParquetWriter(path + ".tmp", SCHEMA, compression="zstd") as writer:
+        while True:
+            query = select(*columns).where(
+                table.c.business_profile_id == business_id,
+                table.c.timestamp >= window_start,
+                table.c.timestamp < window_end,
+            )
+            if last_key:
+                query = query.where(tuple_(table.c.timestamp, table.c.id) > last_key)
+            batch = db.execute(query.order_by(table.c.timestamp, table.c.id).limit(batch_size)).mappings().all()
+            if not batch:
+                break
+            writer.write_table(pa.Table.from_pylist([dict(row) for row in batch], schema=SCHEMA))
+            rows += len(batch)
+            last_key = (batch[-1]["timestamp"], batch[-1]["id"])
+    os.replace(path + ".tmp", path)
+
+    archive_file = models.ChatArchiveFile(
+        business_profile_id=business_id, path=relative, window_start=window_start,
+        window_end=window_end, row_count=rows
+    )
+    db.add(archive_file)
+    db.commit()
+    return archive_file
+
+
+def archive_interactions(
+    db: Session,
+    business_id: Optional[int] = None,
+    now: Optional[datetime] = None,
+    batch_size: int = 10000
+) -> int:
+    """Move interactions past each business's retention horizon into Parquet files.
+
+    Works one business-month at a time: the window is written to a file and
+    registered, then purged from the live table. A run interrupted mid-purge
+    finishes the purge on the next run instead of archiving the rows twice.
+    Returns the number of interactions archived.
+    """
+    now = now or datetime.utcnow()
+    archived = 0
+    for business, days in _retention_days(db).items():
+        if business_id is not None and business != business_id:
+            continue
+        for pending in db.query(models.ChatArchiveFile).filter_by(business_profile_id=business, purged=False).all():
+            _purge_window(db, pending, batch_size)
+
+        # Cut at midnight so archived days are whole and still match their rollups
+        cutoff = datetime.combine((now - timedelta(days=days or DEFAULT_RETENTION_DAYS)).date(), time(0))
+        while True:
+            oldest = db.query(func.min(models.ChatInteraction.timestamp)).filter(
+                models.ChatInteraction.business_profile_id == business,
+                models.ChatInteraction.timestamp < cutoff
+            ).scalar()
+            if oldest is None:
+                break
+            if oldest.tzinfo is not None:
+                oldest = oldest.astimezone(timezone.utc).replace(tzinfo=None)
+            window_start = oldest.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            window_end = min(_next_month(window_start), cutoff)
+            archive_file = _write_window(db, business, window_start, window_end, batch_size)
+            _purge_window(db, archive_file, batch_size)
+            archived += archive_file.row_count
+            logger.info("Archived %s interactions of business %s to %s",
+                        archive_file.row_count, business, archive_file.path)
+    return archived
+
+
+def archived_files(
+    db: Session,
+    business_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> List[models.ChatArchiveFile]:
+    """Archive files of a business whose window overlaps [start, end), oldest first."""
+    query = db.query(models.ChatArchiveFile).filter(models.ChatArchiveFile.business_profile_id == business_id)
+    if start is not None:
+        query = query.filter(models.ChatArchiveFile.window_end > start)
+    if end is not None:
+        query = query.filter(models.ChatArchiveFile.window_start < end)
+    return query.order_by(models.ChatArchiveFile.window_start, models.ChatArchiveFile.id).all()
+
+
+def outside_archived(timestamp_column, files: List[models.ChatArchiveFile]):
+    """Condition excluding live rows in the windows of ``files``, which are read from the archive instead."""
+    return not_(or_(*(
+        and_(timestamp_column >= archive_file.window_start, timestamp_column < archive_file.window_end)
+        for archive_file in files
+    )))
+
+
+def _time_filter(start: Optional[datetime], end: Optional[datetime]):
+    timestamp_type = SCHEMA.field("timestamp").type
+    conditions = []
+    if start is not None:
+        conditions.append(ds.field("timestamp") >= pa.scalar(start, type=timestamp_type))
+    if end is not None:
+        conditions.append(ds.field("timestamp") < pa.scalar(end, type=timestamp_type))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_archive(
+    path: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[List[str]] = None,
+    batch_size: int = 1000
+) -> Iterator[pa.RecordBatch]:
+    """Stream record batches of one archive file, skipping row groups outside [start, end)."""
+    dataset = ds.dataset(os.path.join(ARCHIVE_DIR, path), format="parquet", schema=SCHEMA)
+    for batch in dataset.to_batches(columns=columns, filter=_time_filter(start, end), batch_size=batch_size):
+        if batch.num_rows:
+            yield batch
+
+
+@dataclass
+class ArchiveAggregate:
+    count: int = 0
+    sentiment_sum: float = 0.0
+    categories: Dict[Optional[str], int] = field(default_factory=dict)  # raw values, may be None or ""
+    series: Dict[datetime, Tuple[int, float]] = field(default_factory=dict)
+
+
+def aggregate_archive(
+    files: List[models.ChatArchiveFile],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: Optional[str] = None
+) -> ArchiveAggregate:
+    """Counts, sentiment sums, category counts and (per ``bucket``, UTC) series over archived interactions."""
+    result = ArchiveAggregate()
+    for archive_file in files:
+        for batch in read_archive(archive_file.path, start, end, ["timestamp", "category", "sentiment_score"],
+                                  batch_size=65536):
+            table = pa.Table.from_batches([batch])
+            result.count += table.num_rows
+            result.sentiment_sum += pc.sum(table["sentiment_score"]).as_py() or 0
+
+            for row in table.group_by("category").aggregate([("timestamp", "count")]).to_pylist():
+                result.categories[row["category"]] = result.categories.get(row["category"], 0) + row["timestamp_count"]
+
+            if bucket:
+                periods = pc.floor_temporal(table["timestamp"], unit=bucket, week_starts_monday=True)
+                grouped = pa.table({"period": periods, "sentiment_score": table["sentiment_score"]}) \
+                    .group_by("period").aggregate([("period", "count"), ("sentiment_score", "sum")])
+                for row in grouped.to_pylist():
+                    count, sentiment_sum = result.series.get(row["period"], (0, 0.0))
+                    result.series[row["period"]] = (
+                        count + row["period_count"], sentiment_sum + (row["sentiment_score_sum"] or 0)
+                    )
+    return result
+
+
+def main():
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Archive old chat interactions to Parquet")
+    parser.add_argument("--business-id", type=int, help="Only archive this business")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows read and deleted per statement")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        archived = archive_interactions(db, business_id=args.business_id, batch_size=args.batch_size)
+        logger.info("Archived %s interactions to %s", archived, ARCHIVE_DIR)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
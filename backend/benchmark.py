@@ -0,0 +1,266 @@
+# benchmark.py
+"""Load-test the backend in-process against SQLite and the stub LLM backend.
+
+    python benchmark.py --businesses 20 --requests 500 --concurrency 50 --output results.json
+    python benchmark.py --baseline results.json
+
+Boots ``app`` on a fresh SQLite file, seeds businesses, FAQs and chat history,
+then drives concurrent requests through httpx's ASGI transport (no sockets)
+and reports throughput and latency percentiles per scenario as JSON. Runs are
+deterministic for a given ``--seed``, so results can be compared to a baseline.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+PASSWORD = "benchmark-password"
+SCENARIOS = ("chat", "login", "chat_analysis", "complete_profile")
+COMMON_QUESTIONS = [
+    "What are your opening hours?",
+    "Where are you located?",
+    "Do you accept credit cards?",
+    "What services do you offer?",
+    "Do you have parking?",
+    "Can I book an appointment?",
+]
+
+
+def configure_environment(args):
+    """Point the app at a throwaway database and the stub LLM; must run before importing it."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.database}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["STUB_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    # Measure the service, not the rate limiter, unless asked to
+    os.environ.setdefault("CHAT_RATE_PER_MINUTE", "0")
+    os.environ.setdefault("CHAT_IP_RATE_PER_MINUTE", "0")
+
+
+def seed(args, rng: random.Random, hashed_password: str) -> List[dict]:
+    import models
+    from analytics import backfill_rollups
+    from database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+
+    # Open around the clock so chat runs measure the LLM path whatever time they start
+    hours = {day: {"opening": "00:00", "closing": "00:00"}
+             for day in ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")}
+    now = datetime.utcnow()
+    businesses = []
+
+    db = SessionLocal()
+    try:
+        for n in range(args.businesses):
+            user = models.User(email=f"owner{n}@example.com", hashed_password=hashed_password,
+                               company_name=f"Company {n}", is_active=True, is_verified=True)
+            db.add(user)
+            db.flush()
+            profile = models.BusinessProfile(
+                user_id=user.id, business_name=f"Company {n}", business_type="retail", industry="food",
+                phone="555-0100", address=f"{n} Main St", city="Springfield", state="IL", postal_code="62701",
+                country="US", business_hours=hours, description="Fresh bread, pastries and coffee every day. " * 5,
+                specialties=["bread", "pastries", "coffee"], payment_methods=["cash", "card"]
+            )
+            config = models.ChatbotConfig(
+                user_id=user.id, chatbot_name="Helper", greeting_message="Hi!", tone="friendly",
+                primary_color="#000000", secondary_color="#ffffff", chat_bubble_position="bottom-right",
+                auto_show_delay=1, out_of_hours_message="We're closed right now."
+            )
+            db.add_all([profile, config])
+            db.flush()
+            db.add_all([
+                models.FAQ(business_profile_id=profile.id, question=f"FAQ question {f} about topic {f}?",
+                           answer=f"FAQ answer {f}.", is_active=True)
+                for f in range(args.faqs)
+            ])
+            if args.interactions:
+                db.execute(models.ChatInteraction.__table__.insert(), [
+                    {
+                        "business_profile_id": profile.id,
+                        "user_message": rng.choice(COMMON_QUESTIONS),
+                        "bot_response": "Seeded reply",
+                        "timestamp": now - timedelta(minutes=rng.randrange(60 * 24 * 30)),
+                        "category": rng.choice(["hours", "location", "payment", "services", "general"]),
+                        "sentiment_score": rng.choice([-1, 0, 0, 1]),
+                    }
+                    for _ in range(args.interactions)
+                ])
+            businesses.append({"business_id": profile.id, "email": user.email})
+        db.commit()
+        backfill_rollups(db, until=(now + timedelta(days=1)).date())
+    finally:
+        db.close()
+    return businesses
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float) -> dict:
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> Optional[float]:
+        if not ordered:
+            return None
+        # Nearest-rank percentile
+        index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "requests": len(ordered),
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "mean": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else None,
+            "p50": percentile(50),
+            "p95": percentile(95),
+            "p99": percentile(99),
+            "max": round(ordered[-1] * 1000, 3) if ordered else None,
+        },
+    }
+
+
+async def drive(client, make_request: Callable[[int], tuple], total: int, concurrency: int) -> dict:
+    """Send ``total`` requests from ``concurrency`` workers; make_request(i) -> (method, url, kwargs)."""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            method, url, kwargs = make_request(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+async def run(args) -> dict:
+    import httpx
+    from passwords import password_hasher
+
+    rng = random.Random(args.seed)
+    businesses = seed(args, rng, await password_hasher.hash(PASSWORD))
+
+    from app import app, create_access_token
+
+    tokens = [create_access_token({"sub": b["email"]}, expires_delta=timedelta(hours=1)) for b in businesses]
+    messages = [
+        rng.choice(COMMON_QUESTIONS) if rng.random() < args.repeat_ratio else f"Unique question number {i}?"
+        for i in range(args.requests)
+    ]
+    week_ago = (datetime.utcnow() - timedelta(days=7)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def pick(i: int) -> int:
+        return (i * 7919 + args.seed) % len(businesses)
+
+    requests = {
+        "chat": lambda i: ("POST", f"/api/chat/{businesses[pick(i)]['business_id']}", {"json": {"message": messages[i]}}),
+        "login": lambda i: ("POST", "/api/login", {"json": {"email": businesses[pick(i)]["email"], "password": PASSWORD}}),
+        "chat_analysis": lambda i: ("GET", "/api/user/chat-analysis", {
+            "params": {"from": week_ago.isoformat(), "bucket": "day"},
+            "headers": {"Authorization": f"Bearer {tokens[pick(i)]}"},
+        }),
+        "complete_profile": lambda i: ("GET", "/api/user/complete-profile", {
+            "headers": {"Authorization": f"Bearer {tokens[pick(i)]}"},
+        }),
+    }
+
+    results = {}
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for name in args.scenarios:
+                if args.warmup:
+                    await drive(client, requests[name], min(args.warmup, args.requests), args.concurrency)
+                results[name] = await drive(client, requests[name], args.requests, args.concurrency)
+                print(f"{name}: {results[name]['throughput_rps']} req/s, "
+                      f"p95 {results[name]['latency_ms']['p95']} ms", file=sys.stderr)
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def compare(results: dict, baseline: dict) -> dict:
+    """Relative change per scenario against a previous run (positive = more / slower)."""
+    def change(new, old):
+        return round((new - old) / old, 4) if new is not None and old else None
+
+    deltas = {}
+    for name, result in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous:
+            deltas[name] = {
+                "throughput_rps": change(result["throughput_rps"], previous["throughput_rps"]),
+                **{f"latency_{key}": change(result["latency_ms"][key], previous["latency_ms"][key])
+                   for key in ("p50", "p95", "p99")},
+            }
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend load test against SQLite and a stub LLM")
+    parser.add_argument("--businesses", type=int, default=10)
+    parser.add_argument("--faqs", type=int, default=10, help="FAQs per business")
+    parser.add_argument("--interactions", type=int, default=2000, help="Seeded chat interactions per business")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests before each scenario")
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--repeat-ratio", type=float, default=0.5,
+                        help="Share of chat messages drawn from a few common questions (cacheable)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database", help="SQLite file to create (default: a temporary file)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    temp_dir = None
+    if not args.database:
+        temp_dir = tempfile.TemporaryDirectory(prefix="retailai-bench-")
+        args.database = os.path.join(temp_dir.name, "benchmark.db")
+    elif os.path.exists(args.database):
+        parser.error(f"{args.database} already exists; the benchmark needs a fresh database")
+    configure_environment(args)
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if temp_dir:
+            temp_dir.cleanup()
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "database")},
+        "scenarios": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["baseline_change"] = compare(results, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
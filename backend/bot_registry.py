@@ -0,0 +1,121 @@
+# bot_registry.py
+import copy
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models
+from chatbot import GeminiCompanyBot
+from llm_backends import LLMBackend, get_llm_backend
+from lru import LRUCache
+from response_cache import response_cache
+
+load_dotenv()
+
+
+def snapshot_row(row) -> Mapping:
+    """Read-only copy of an ORM row's column values, without SQLAlchemy instance state."""
+    return MappingProxyType({
+        column.key: copy.deepcopy(getattr(row, column.key))
+        for column in row.__table__.columns
+    })
+
+
+@dataclass(frozen=True)
+class BotEntry:
+    business_id: int
+    user_id: int
+    business_name: str
+    profile: Mapping
+    config: Optional[Mapping]
+    bot: Optional[GeminiCompanyBot]
+
+
+class BotRegistry:
+    """Per-process, LRU-bounded cache of warm chatbots keyed by business_id.
+
+    Each entry holds an immutable snapshot of the business profile and chatbot
+    config plus a bot whose prompt chunks and retrieval index are built once, so the chat
+    path does no ORM queries or prompt rendering on a hit. Callers that change a
+    profile, config or FAQ must call ``invalidate`` after committing. A load
+    that overlaps an invalidation is not cached, and entries expire after
+    ``ttl`` seconds so changes made through other worker processes show up.
+    """
+
+    def __init__(self, maxsize: int = 1024, backend: Optional[LLMBackend] = None,
+                 prompt_top_k: int = 4, prompt_context_tokens: int = 400, ttl: Optional[float] = 300):
+        self._backend = backend
+        self.prompt_top_k = prompt_top_k
+        self.prompt_context_tokens = prompt_context_tokens
+        self._entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._generations = {}
+
+    async def get(self, db: AsyncSession, business_id: int) -> Optional[BotEntry]:
+        """Return the warm entry for ``business_id``, loading it on a miss (None if unknown)."""
+        entry = self._entries.get(business_id)
+        if entry is None:
+            generation = self._generations.get(business_id, 0)
+            entry = await db.run_sync(self._load, business_id)
+            if entry is not None and generation == self._generations.get(business_id, 0):
+                self._entries.set(business_id, entry)
+        return entry
+
+    def invalidate(self, business_id: Optional[int]) -> None:
+        if business_id is not None:
+            self._generations[business_id] = self._generations.get(business_id, 0) + 1
+            self._entries.pop(business_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _load(self, db: Session, business_id: int) -> Optional[BotEntry]:
+        business_profile = db.query(models.BusinessProfile).filter(
+            models.BusinessProfile.id == business_id,
+            models.BusinessProfile.deleted_at.is_(None)
+        ).first()
+        if not business_profile:
+            return None
+
+        chatbot_config = db.query(models.ChatbotConfig).filter(
+            models.ChatbotConfig.user_id == business_profile.user_id
+        ).first()
+
+        profile = snapshot_row(business_profile)
+        config = snapshot_row(chatbot_config) if chatbot_config else None
+        bot = None
+        if config:
+            faqs = db.query(models.FAQ.question, models.FAQ.answer).filter(
+                models.FAQ.business_profile_id == business_id,
+                models.FAQ.is_active == True
+            ).order_by(models.FAQ.priority.desc(), models.FAQ.id).all()
+            bot = GeminiCompanyBot(
+                business_profile=profile,
+                config=config,
+                backend=self._backend or get_llm_backend(),
+                response_cache=response_cache,
+                faqs=[(question, answer) for question, answer in faqs],
+                top_k=self.prompt_top_k,
+                context_tokens=self.prompt_context_tokens
+            )
+
+        return BotEntry(
+            business_id=business_id,
+            user_id=business_profile.user_id,
+            business_name=business_profile.business_name,
+            profile=profile,
+            config=config,
+            bot=bot,
+        )
+
+
+bot_registry = BotRegistry(
+    maxsize=int(os.getenv("BOT_REGISTRY_SIZE", "1024")),
+    prompt_top_k=int(os.getenv("PROMPT_TOP_K", "4")),
+    prompt_context_tokens=int(os.getenv("PROMPT_CONTEXT_TOKENS", "400")),
+    ttl=float(os.getenv("BOT_REGISTRY_TTL_SECONDS", "300")),
+)
@@ -0,0 +1,97 @@
+# business_hours.py
+import bisect
+import logging
+import os
+from datetime import datetime, timezone
+from typing import List, Mapping, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Used for profiles without a timezone; unset means their hours are not enforced
+DEFAULT_TIMEZONE = os.getenv("BUSINESS_TIMEZONE") or None
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def _parse_minutes(value: str) -> int:
+    hours, minutes = value.strip().split(":")[:2]
+    total = int(hours) * 60 + int(minutes)
+    if not 0 <= total <= MINUTES_PER_DAY:
+        raise ValueError(f"Time out of range: {value}")
+    return total
+
+
+def _merge(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class WeeklySchedule:
+    """Opening hours compiled to sorted, non-overlapping [start, end) minute-of-week intervals.
+
+    ``is_open`` converts the instant to the business's timezone and bisects
+    the interval starts, so a lookup is O(log n) with no parsing. Hours that
+    close at or before they open run past midnight into the next day, and
+    Sunday night wraps into Monday morning.
+    """
+
+    def __init__(self, intervals: List[Tuple[int, int]], tz: ZoneInfo):
+        self.intervals = _merge(intervals)
+        self.tz = tz
+        self._starts = [start for start, _ in self.intervals]
+
+    @classmethod
+    def compile(cls, business_hours: Optional[Mapping], tz_name: Optional[str] = None) -> Optional["WeeklySchedule"]:
+        """Build a schedule from ``schemas.BusinessHours`` data ({day: {"opening": "HH:MM", "closing": "HH:MM"}}).
+
+        Days without both times are closed. Returns None, meaning "always open",
+        when no day has hours, the data can't be parsed or there is no known
+        timezone to read the hours in (``tz_name`` nor ``BUSINESS_TIMEZONE``),
+        so a half-filled profile never turns every visitor away.
+        """
+        if not isinstance(business_hours, Mapping):
+            return None
+        tz_name = tz_name or DEFAULT_TIMEZONE
+        if not tz_name:
+            return None
+        try:
+            tz = ZoneInfo(tz_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning("Unknown timezone %r; treating business hours as always open", tz_name)
+            return None
+
+        intervals = []
+        try:
+            for index, day in enumerate(DAYS):
+                hours = business_hours.get(day)
+                if not isinstance(hours, Mapping) or not hours.get("opening") or not hours.get("closing"):
+                    continue
+                opening, closing = _parse_minutes(hours["opening"]), _parse_minutes(hours["closing"])
+                if closing <= opening:
+                    closing += MINUTES_PER_DAY  # open past midnight, or around the clock when equal
+                start, end = index * MINUTES_PER_DAY + opening, index * MINUTES_PER_DAY + closing
+                if end > MINUTES_PER_WEEK:
+                    intervals.append((0, end - MINUTES_PER_WEEK))
+                    end = MINUTES_PER_WEEK
+                intervals.append((start, end))
+        except (TypeError, ValueError, AttributeError):
+            logger.warning("Could not parse business hours %r; treating as always open", business_hours)
+            return None
+        return cls(intervals, tz) if intervals else None
+
+    def is_open(self, now: Optional[datetime] = None) -> bool:
+        local = (now or datetime.now(timezone.utc)).astimezone(self.tz)
+        minute = local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+        index = bisect.bisect_right(self._starts, minute) - 1
+        return index >= 0 and minute < self.intervals[index][1]
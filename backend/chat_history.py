@@ -0,0 +1,122 @@
+# chat_history.py
+import asyncio
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+import models
+from archive import archived_files, outside_archived, read_archive
+
+EXPORT_COLUMNS = ("id", "timestamp", "user_message", "bot_response", "category", "sentiment_score")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp: datetime, interaction_id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), interaction_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of ``encode_cursor``; raises InvalidCursor for anything it did not produce."""
+    try:
+        timestamp, interaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(timestamp), int(interaction_id)
+    except Exception as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def _filtered(query, business_id: int, start: Optional[datetime], end: Optional[datetime]):
+    table = models.ChatInteraction.__table__
+    query = query.where(table.c.business_profile_id == business_id)
+    if start is not None:
+        query = query.where(table.c.timestamp >= start)
+    if end is not None:
+        query = query.where(table.c.timestamp < end)
+    return query
+
+
+def history_page(
+    db: Session,
+    business_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> dict:
+    """One page of a business's chat interactions, newest first.
+
+    Keyset pagination on (business_profile_id, timestamp, id): each page
+    continues strictly after the last row of the previous one, so deep pages
+    cost the same as the first and never skip or repeat rows.
+    """
+    table = models.ChatInteraction.__table__
+    query = _filtered(select(*(table.c[name] for name in EXPORT_COLUMNS)), business_id, start, end)
+    if cursor:
+        query = query.where(tuple_(table.c.timestamp, table.c.id) < decode_cursor(cursor))
+    rows = db.execute(
+        query.order_by(table.c.timestamp.desc(), table.c.id.desc()).limit(limit + 1)
+    ).mappings().all()
+
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]["timestamp"], items[-1]["id"]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def export_rows(
+    session_factory: Callable,
+    business_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = 1000
+) -> AsyncIterator[List[dict]]:
+    """Yield a business's chat interactions, oldest first, ``batch_size`` rows at a time.
+
+    Archived interactions (all older than the live ones) are read first, one
+    record batch at a time off the event loop; live rows then come from a
+    server-side cursor, so memory stays flat however many there are. Uses its
+    own session because it outlives the request handler.
+    """
+    table = models.ChatInteraction.__table__
+    query = _filtered(select(*(table.c[name] for name in EXPORT_COLUMNS)), business_id, start, end)
+    async with session_factory() as session:
+        files = await session.run_sync(archived_files, business_id, start, end)
+        for archive_file in files:
+            batches = read_archive(archive_file.path, start, end, list(EXPORT_COLUMNS), batch_size)
+            while (batch := await asyncio.to_thread(next, batches, None)) is not None:
+                yield batch.to_pylist()
+
+        if files:
+            query = query.where(outside_archived(table.c.timestamp, files))
+        result = await session.stream(query.order_by(table.c.timestamp, table.c.id))
+        async for partition in result.mappings().partitions(batch_size):
+            yield [dict(row) for row in partition]
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+async def ndjson_lines(batches: AsyncIterator[List[dict]]) -> AsyncIterator[str]:
+    async for batch in batches:
+        yield "".join(json.dumps(row, default=_json_default) + "\n" for row in batch)
+
+
+async def csv_lines(batches: AsyncIterator[List[dict]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    yield buffer.getvalue()
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
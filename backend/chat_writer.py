@@ -0,0 +1,172 @@
+# chat_writer.py
+import asyncio
+import logging
+import os
+from typing import Callable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from analytics import apply_rollups
+from database import SessionLocal
+from metrics import CHAT_WRITE_SECONDS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class ChatInteractionWriter:
+    """Write-behind buffer for ChatInteraction rows.
+
+    Requests enqueue plain dicts and return immediately; a single background task
+    flushes them with one multi-row INSERT per batch once ``batch_size`` rows are
+    queued or ``flush_interval`` seconds have passed since the batch's first
+    row arrived, updating the daily
+    analytics rollups in the same transaction. The queue is bounded, so
+    when the database falls behind, ``enqueue`` waits for room (backpressure)
+    instead of letting memory grow. ``stop`` drains everything still queued.
+
+    Rows for businesses deleted while they were queued are discarded, and a
+    batch rejected by a constraint is retried row by row, so one bad row never
+    costs other tenants their history.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        max_queue: int = 10000,
+        max_retries: int = 3
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.written = 0
+        self.dropped = 0
+        self.discarded = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def enqueue(self, record: dict):
+        """Queue one chat_interactions row, waiting while the queue is full."""
+        self.start()
+        await self._queue.put(record)
+
+    async def stop(self):
+        """Flush every queued row and stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            record = await self._queue.get()
+            if record is None:
+                break
+            # Collect rows until the batch is full or flush_interval has passed since its first row
+            batch: List[dict] = [record]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    record = self._queue.get_nowait()
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[dict]):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                with CHAT_WRITE_SECONDS.time():
+                    written, discarded = await asyncio.to_thread(self._write, batch)
+                self.written += written
+                self.discarded += discarded
+                return
+            except Exception:
+                logger.exception("Failed to write %d chat interactions (attempt %d)", len(batch), attempt)
+                await asyncio.sleep(min(2 ** attempt, 10) * 0.1)
+        self.dropped += len(batch)
+        logger.error("Dropped %d chat interactions after %d attempts", len(batch), self.max_retries)
+
+    def _write(self, batch: List[dict]) -> Tuple[int, int]:
+        """Insert a batch; returns (rows written, rows discarded)."""
+        db = self.session_factory()
+        try:
+            live = self._live_businesses(db, {record["business_profile_id"] for record in batch})
+            rows = [record for record in batch if record["business_profile_id"] in live]
+            if len(rows) < len(batch):
+                logger.warning("Discarding %d chat interactions of deleted businesses", len(batch) - len(rows))
+            if not rows:
+                return 0, len(batch)
+            try:
+                self._insert(db, rows)
+                db.commit()
+                return len(rows), len(batch) - len(rows)
+            except IntegrityError as e:
+                db.rollback()
+                logger.warning("Batch of %d chat interactions rejected (%s); writing row by row", len(rows), e.orig)
+
+            written = 0
+            for row in rows:
+                try:
+                    self._insert(db, [row])
+                    db.commit()
+                    written += 1
+                except IntegrityError:
+                    db.rollback()
+                    logger.warning("Discarding chat interaction of business %s rejected by the database",
+                                   row["business_profile_id"])
+            return written, len(batch) - written
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _live_businesses(db: Session, business_ids: Set[int]) -> Set[int]:
+        profile = models.BusinessProfile
+        return set(db.execute(
+            select(profile.id).where(profile.id.in_(business_ids), profile.deleted_at.is_(None))
+        ).scalars())
+
+    @staticmethod
+    def _insert(db: Session, rows: List[dict]):
+        db.execute(models.ChatInteraction.__table__.insert(), rows)
+        apply_rollups(db, rows)
+
+
+chat_writer = ChatInteractionWriter(
+    batch_size=int(os.getenv("CHAT_WRITE_BATCH_SIZE", "200")),
+    flush_interval=float(os.getenv("CHAT_WRITE_FLUSH_SECONDS", "0.5")),
+    max_queue=int(os.getenv("CHAT_WRITE_QUEUE_SIZE", "10000")),
+)
@@ -1,47 +1,60 @@
 # chatbot.py
-import google.generativeai as genai
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Mapping, Optional, Sequence, Tuple
+from contextlib import aclosing
 from datetime import datetime
 import json
+import logging
+from llm_backends import LLMBackend, estimate_tokens
+from response_cache import ResponseCache
+from metrics import CHAT_STAGE_SECONDS
+from retrieval import ChunkIndex
+from business_hours import WeeklySchedule
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_CHUNK_WORDS = 60
+
+
+def _format_hours(business_hours) -> str:
+    """One line per day ("Monday 09:00-17:00") instead of pretty-printed JSON"""
+    if not isinstance(business_hours, Mapping):
+        return json.dumps(business_hours)
+    days = []
+    for day, hours in business_hours.items():
+        if isinstance(hours, Mapping) and hours.get('opening') and hours.get('closing'):
+            days.append(f"{day.capitalize()} {hours['opening']}-{hours['closing']}")
+        else:
+            days.append(f"{day.capitalize()} closed")
+    return "; ".join(days)
+
+
+def _split_words(text: str, size: int) -> List[str]:
+    words = text.split()
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
 
 class GeminiCompanyBot:
-    def __init__(self, business_profile: dict, config: dict, api_key: str):
+    def __init__(self, business_profile: Mapping, config: Mapping, backend: LLMBackend,
+                 response_cache: Optional[ResponseCache] = None, faqs: Sequence[Tuple[str, str]] = (),
+                 top_k: int = 4, context_tokens: int = 400):
             self.business_profile = business_profile
             self.config = config
-            # Configure Gemini
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
+            self.backend = backend
+            self.response_cache = response_cache
+            self._cache_generation = response_cache.generation(business_profile['id']) if response_cache else None
+            self.top_k = top_k
+            self.context_tokens = context_tokens
             self.context = self._build_context()
-            self.session_history = []  
+            self.chunk_index = ChunkIndex(self._build_chunks(faqs))
+            self.schedule = WeeklySchedule.compile(business_profile['business_hours'], business_profile.get('timezone'))
         
     def _build_context(self) -> str:
-            """Build context from business profile"""
-            business_hours = json.dumps(self.business_profile['business_hours'], indent=2)
-            specialties = ', '.join(self.business_profile['specialties']) if self.business_profile['specialties'] else ''
-            payment_methods = ', '.join(self.business_profile['payment_methods']) if self.business_profile['payment_methods'] else ''
-            
+            """Build the part of the prompt sent with every question: persona, tone and instructions"""
             context = f"""
               {self.config['greeting_message']}
               
               You are {self.config['chatbot_name']}, a customer service assistant for {self.business_profile['business_name']}.
               
-              Company Information:
-              - Business Type: {self.business_profile['business_type']}
-              - Industry: {self.business_profile['industry']}
-              - Description: {self.business_profile['description']}
-              
-              Contact Information:
-              - Phone: {self.business_profile['phone']}
-              - Address: {self.business_profile['address']}, {self.business_profile['city']}, {self.business_profile['state']} {self.business_profile['postal_code']}
-              - Website: {self.business_profile['website']}
-              
-              Business Hours:
-              {business_hours}
-              
-              Services & Payment:
-              - Specialties: {specialties}
-              - Payment Methods: {payment_methods}
-              
               Communication Style:
               - Tone: {self.config['tone']}
               
@@ -51,37 +64,142 @@ class GeminiCompanyBot:
               3. If outside business hours, mention: "{self.config['out_of_hours_message']}"
               4. If unsure about any information, offer to connect with a human representative
               5. Be helpful, accurate, and concise
+              6. Use only the information below; it was selected as relevant to the question
               """
-            print(f"Generated Context : {context}") # print the context
+            logger.debug("Generated context for %s: %s", self.business_profile['business_name'], context)
             return context
 
-    def _is_within_business_hours(self) -> bool:
-        """Check if current time is within business hours"""
-        return True # Always true for testing
+    def _build_chunks(self, faqs: Sequence[Tuple[str, str]]) -> List[str]:
+            """Split the business profile and FAQs into independently retrievable chunks"""
+            profile = self.business_profile
+            name = profile['business_name']
+            chunks = [
+                f"Company information: {name} is a {profile['business_type']} business in the {profile['industry']} industry.",
+                f"Contact and location: phone {profile['phone']}; address {profile['address']}, {profile['city']}, "
+                f"{profile['state']} {profile['postal_code']}; website {profile['website']}.",
+                f"Business hours, opening and closing times: {_format_hours(profile['business_hours'])}.",
+            ]
+            if profile['specialties']:
+                chunks.append(f"Specialties, products and services: {', '.join(profile['specialties'])}.")
+            if profile['payment_methods']:
+                chunks.append(f"Payment methods accepted: {', '.join(profile['payment_methods'])}.")
+            for paragraph in _split_words(profile['description'] or '', DESCRIPTION_CHUNK_WORDS):
+                chunks.append(f"About {name}: {paragraph}")
+            for question, answer in faqs:
+                chunks.append(f"FAQ: {question} {answer}")
+            return chunks
+
+    def _build_prompt(self, message: str) -> str:
+            """Persona plus the top-k profile chunks relevant to ``message`` that fit the token budget"""
+            with CHAT_STAGE_SECONDS.labels("prompt").time():
+                selected, budget = [], self.context_tokens
+                for index, _ in self.chunk_index.search(message, self.top_k) or [(0, 0.0)]:
+                    chunk = self.chunk_index.chunks[index]
+                    tokens = estimate_tokens(chunk)
+                    if tokens > budget:
+                        continue
+                    selected.append(chunk)
+                    budget -= tokens
+
+                information = "\n".join(f"- {chunk}" for chunk in selected)
+                prompt = f"{self.context}\n\nRelevant Information:\n{information}\n\nUser Question: {message}"
+            logger.info("Prompt for business %s: ~%d tokens, %d of %d chunks",
+                        self.business_profile['id'], estimate_tokens(prompt), len(selected), len(self.chunk_index.chunks))
+            return prompt
+
+    def cached_response(self, message: str) -> Optional[str]:
+        """Cached answer to ``message``, if any; free to call, no LLM or admission slot involved"""
+        if self.response_cache is None:
+            return None
+        return self.response_cache.get(self.business_profile['id'], message)
 
-    async def get_response(self, message: str) -> str:
-        """Get response from Gemini API"""
+    def _cache_response(self, message: str, response_text: str):
+        # Only successful LLM answers are cached; errors and out-of-hours replies are not
+        if self.response_cache is not None:
+            self.response_cache.set(self.business_profile['id'], message, response_text,
+                                    generation=self._cache_generation)
+
+    def _is_within_business_hours(self, now: Optional[datetime] = None) -> bool:
+        """Check if ``now`` (default: the current time) is within business hours"""
+        return self.schedule is None or self.schedule.is_open(now)
+
+    def is_out_of_hours(self, now: Optional[datetime] = None) -> bool:
+        """True when the configured out-of-hours message should be sent instead of asking the LLM"""
+        return bool(self.config['show_business_hours'] and self.config['out_of_hours_message']) \
+            and not self._is_within_business_hours(now)
+
+    async def get_response(self, message: str, history: Optional[List[Dict]] = None,
+                           skip_precheck: bool = False) -> str:
+        """Get response from the LLM backend, continuing the conversation in ``history``
+
+        Pass ``skip_precheck`` when the caller already checked business hours and the cache.
+        """
         try:
-            # Check business hours if enabled
-            if self.config['show_business_hours'] and not self._is_within_business_hours():
-                return self.config['out_of_hours_message']
+            if not skip_precheck:
+                # Check business hours if enabled
+                if self.is_out_of_hours():
+                    return self.config['out_of_hours_message']
+
+                # Answers that depend on earlier turns are neither served from nor stored in the cache
+                cached = None if history else self.cached_response(message)
+                if cached is not None:
+                    return cached
 
-            # Prepare chat
-            chat = self.model.start_chat(history=[])
-            
             # Add context and get response
-            response = chat.send_message(
-                f"{self.context}\n\nUser Question: {message}",
-                generation_config={"max_output_tokens": self.config['max_message_length']}
+            response_text = await self.backend.generate(
+                self._build_prompt(message),
+                history=history,
+                max_output_tokens=self.config['max_message_length']
             )
             
             # Extract and format response
-            response_text = response.text
             if len(response_text) > self.config['max_message_length']:
                 response_text = response_text[:self.config['max_message_length']] + "..."
                 
+            if not history:
+                self._cache_response(message, response_text)
             return response_text
             
         except Exception as e:
-            return f"I apologize, but I'm having trouble processing your request. Please try again or contact support. Error: {str(e)}" 
-        
+            return f"I apologize, but I'm having trouble processing your request. Please try again or contact support. Error: {str(e)}"
+
+    async def stream_response(self, message: str, history: Optional[List[Dict]] = None,
+                              skip_precheck: bool = False) -> AsyncIterator[str]:
+        """Stream the response from the LLM backend, truncated like get_response"""
+        try:
+            if not skip_precheck:
+                # Check business hours if enabled
+                if self.is_out_of_hours():
+                    yield self.config['out_of_hours_message']
+                    return
+
+                # Answers that depend on earlier turns are neither served from nor stored in the cache
+                cached = None if history else self.cached_response(message)
+                if cached is not None:
+                    yield cached
+                    return
+
+            max_length = self.config['max_message_length']
+            parts = []
+            sent = 0
+            chunks = self.backend.stream(
+                self._build_prompt(message),
+                history=history,
+                max_output_tokens=max_length
+            )
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    if sent + len(chunk) > max_length:
+                        chunk = chunk[:max_length - sent] + "..."
+                        parts.append(chunk)
+                        yield chunk
+                        break
+                    sent += len(chunk)
+                    parts.append(chunk)
+                    yield chunk
+
+            if not history:
+                self._cache_response(message, "".join(parts))
+
+        except Exception as e:
+            yield f"I apologize, but I'm having trouble processing your request. Please try again or contact support. Error: {str(e)}"
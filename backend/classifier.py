@@ -0,0 +1,143 @@
+# classifier.py
+import bisect
+import json
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from lru import LRUCache
+
+# Category -> keywords; on a tie the earlier category wins
+DEFAULT_CATEGORIES: Dict[str, List[str]] = {
+    "hours": ["hours", "time", "open", "close", "closing", "opening"],
+    "location": ["location", "address", "where", "directions"],
+    "payment": ["payment", "pay", "method", "card", "cash", "refund"],
+    "services": ["services", "service", "offer", "provide"],
+}
+DEFAULT_CATEGORY = "general"
+
+DEFAULT_SENTIMENT: Dict[str, float] = {
+    "good": 1, "great": 1.5, "excellent": 2, "happy": 1, "love": 2, "best": 1.5, "thanks": 0.5, "thank you": 0.5,
+    "bad": -1, "terrible": -2, "awful": -2, "unhappy": -1, "hate": -2, "worst": -2, "disappointed": -1.5,
+}
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex alternation factored into a prefix trie.
+
+    Each position of the input is tried against one branch per character rather
+    than once per keyword, so matching cost does not grow with the keyword count.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def render(node: dict) -> str:
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return render(trie)
+
+
+class MessageClassifier:
+    """Category and sentiment scoring for chat messages from a keyword taxonomy.
+
+    Every category keyword and sentiment term is compiled into one regex, so
+    a message is scanned once. Terms match as whole words, plain or with an
+    ``s``/``es`` plural, and may start or end with punctuation ("c++", "24/7"). The category is the one
+    with the most keyword hits; sentiment is the weighted lexicon sum scaled
+    to [-1, 1].
+    """
+
+    def __init__(
+        self,
+        categories: Optional[Mapping[str, Iterable[str]]] = None,
+        sentiment: Optional[Mapping[str, float]] = None,
+        default_category: str = DEFAULT_CATEGORY
+    ):
+        categories = DEFAULT_CATEGORIES if categories is None else categories
+        sentiment = DEFAULT_SENTIMENT if sentiment is None else sentiment
+        self.default_category = default_category
+        self._categories = list(categories)
+        self._category_of: Dict[str, int] = {}
+        for index, name in enumerate(self._categories):
+            for keyword in categories[name]:
+                self._category_of.setdefault(self._normalize(keyword), index)
+        self._weights = {self._normalize(term): float(weight) for term, weight in sentiment.items()}
+
+        terms = {term for term in list(self._category_of) + list(self._weights) if term}
+        self._pattern = re.compile(r"(?<!\w)(" + _trie_pattern(terms) + r")(?:e?s)?(?!\w)") if terms else None
+
+    @staticmethod
+    def _normalize(term: str) -> str:
+        return " ".join(term.lower().split())
+
+    def classify(self, message: str) -> Tuple[str, float]:
+        """Return ``(category, sentiment_score)`` for a single message."""
+        return self.classify_batch([message])[0]
+
+    def classify_batch(self, messages: Iterable[str]) -> List[Tuple[str, float]]:
+        """Classify many messages with a single regex scan, e.g. for backfills.
+
+        Normalized messages contain no newlines, so they are joined with one and
+        each match is attributed to its message by offset; no term can span two.
+        """
+        texts = [self._normalize(message) for message in messages]
+        if self._pattern is None:
+            return [(self.default_category, 0.0)] * len(texts)
+
+        starts, offset = [], 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        hits = [[0] * len(self._categories) for _ in texts]
+        scores = [0.0] * len(texts)
+        magnitudes = [0.0] * len(texts)
+        for match in self._pattern.finditer("\n".join(texts)):
+            message = bisect.bisect_right(starts, match.start()) - 1
+            term = match.group(1)
+            index = self._category_of.get(term)
+            if index is not None:
+                hits[message][index] += 1
+            weight = self._weights.get(term)
+            if weight is not None:
+                scores[message] += weight
+                magnitudes[message] += abs(weight)
+
+        results = []
+        for counts, score, magnitude in zip(hits, scores, magnitudes):
+            best = max(range(len(counts)), key=lambda i: (counts[i], -i), default=None)
+            category = self._categories[best] if best is not None and counts[best] else self.default_category
+            results.append((category, score / magnitude if magnitude else 0.0))
+        return results
+
+
+default_classifier = MessageClassifier()
+
+_classifiers = LRUCache(maxsize=1024)
+
+
+def classifier_for(rules: Optional[Mapping] = None) -> MessageClassifier:
+    """Compiled classifier for a chatbot config's ``classification_rules`` (None: the defaults).
+
+    Rules look like ``{"categories": {"hours": ["open", ...]}, "sentiment": {"great": 1.5}}``;
+    either key may be omitted to keep the default. Compiled classifiers are shared
+    between businesses with identical rules.
+    """
+    if not rules:
+        return default_classifier
+    key = json.dumps(rules)
+    classifier = _classifiers.get(key)
+    if classifier is None:
+        classifier = MessageClassifier(
+            categories=rules.get("categories"),
+            sentiment=rules.get("sentiment"),
+            default_category=rules.get("default_category") or DEFAULT_CATEGORY
+        )
+        _classifiers.set(key, classifier)
+    return classifier
@@ -0,0 +1,178 @@
+# faq_index.py
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models
+from lru import LRUCache
+
+load_dotenv()
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+    a an and are as at be by can do does for from how i in is it me my of on or
+    our please the to we what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> list:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class FAQIndex:
+    """In-memory TF-IDF index over one business's active FAQ questions.
+
+    Documents can be added, replaced and removed one at a time; the postings
+    lists are maintained incrementally, while IDF-weighted, normalized document
+    vectors are recomputed lazily on the next lookup after a change. Lookups
+    only score documents that share a term with the message.
+    """
+
+    def __init__(self):
+        self._docs: Dict[int, Tuple[Counter, str, int]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._vectors: Dict[int, Dict[str, float]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def upsert(self, faq_id: int, question: str, answer: str, priority: int = 0):
+        with self._lock:
+            self._remove(faq_id)
+            terms = Counter(tokenize(question))
+            self._docs[faq_id] = (terms, answer, priority or 0)
+            for term in terms:
+                self._postings.setdefault(term, set()).add(faq_id)
+            self._dirty = True
+
+    def remove(self, faq_id: int):
+        with self._lock:
+            self._remove(faq_id)
+
+    def match(self, message: str, threshold: float) -> Optional[Tuple[int, str, float]]:
+        """Best (faq_id, answer, score) with cosine similarity >= threshold, or None."""
+        query = Counter(tokenize(message))
+        if not query or not self._docs:
+            return None
+        with self._lock:
+            if self._dirty:
+                self._rebuild_vectors()
+            # Terms no FAQ contains still count towards the query norm (idf with df=0),
+            # so a long off-topic message sharing one keyword scores low
+            query_vector = _normalize({term: count * self._idf(term) for term, count in query.items()})
+
+            scores: Dict[int, float] = {}
+            for term, weight in query_vector.items():
+                for faq_id in self._postings.get(term, ()):
+                    scores[faq_id] = scores.get(faq_id, 0.0) + weight * self._vectors[faq_id][term]
+
+            best = None
+            for faq_id, score in scores.items():
+                priority = self._docs[faq_id][2]
+                if score >= threshold and (best is None or (score, priority) > (best[2], best[3])):
+                    best = (faq_id, self._docs[faq_id][1], score, priority)
+        return best[:3] if best else None
+
+    def _remove(self, faq_id: int):
+        doc = self._docs.pop(faq_id, None)
+        if doc:
+            for term in doc[0]:
+                postings = self._postings[term]
+                postings.discard(faq_id)
+                if not postings:
+                    del self._postings[term]
+            self._vectors.pop(faq_id, None)
+            self._dirty = True
+
+    def _idf(self, term: str) -> float:
+        return math.log((1 + len(self._docs)) / (1 + len(self._postings.get(term, ())))) + 1
+
+    def _rebuild_vectors(self):
+        self._vectors = {
+            faq_id: _normalize({term: count * self._idf(term) for term, count in terms.items()})
+            for faq_id, (terms, _, _) in self._docs.items()
+        }
+        self._dirty = False
+
+
+def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+
+class FAQIndexRegistry:
+    """LRU-bounded per-business FAQ indexes, loaded from the faqs table on first use.
+
+    An index loaded while the business's FAQs changed is used once but not
+    cached, and indexes expire after ``ttl`` seconds so edits made through
+    other worker processes show up.
+    """
+
+    def __init__(self, maxsize: int = 1024, threshold: float = 0.75, ttl: Optional[float] = 300):
+        self.threshold = threshold
+        self._indexes = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._generations: Dict[int, int] = {}
+
+    async def get(self, db: AsyncSession, business_id: int) -> FAQIndex:
+        index = self._indexes.get(business_id)
+        if index is None:
+            generation = self._generations.get(business_id, 0)
+            index = await db.run_sync(self._load, business_id)
+            if generation == self._generations.get(business_id, 0):
+                self._indexes.set(business_id, index)
+        return index
+
+    async def match(self, db: AsyncSession, business_id: int, message: str) -> Optional[Tuple[int, str, float]]:
+        index = await self.get(db, business_id)
+        return index.match(message, self.threshold)
+
+    def upsert(self, faq: models.FAQ):
+        """Apply a created/updated FAQ to an already-loaded index."""
+        self._bump(faq.business_profile_id)
+        index = self._indexes.get(faq.business_profile_id)
+        if index is not None:
+            if faq.is_active:
+                index.upsert(faq.id, faq.question, faq.answer, faq.priority)
+            else:
+                index.remove(faq.id)
+
+    def remove(self, business_id: int, faq_id: int):
+        self._bump(business_id)
+        index = self._indexes.get(business_id)
+        if index is not None:
+            index.remove(faq_id)
+
+    def invalidate(self, business_id: int):
+        self._bump(business_id)
+        self._indexes.pop(business_id)
+
+    def _bump(self, business_id: int):
+        # Loads already in flight read the FAQs before this change; don't cache them
+        self._generations[business_id] = self._generations.get(business_id, 0) + 1
+
+    @staticmethod
+    def _load(db: Session, business_id: int) -> FAQIndex:
+        index = FAQIndex()
+        faqs = db.query(models.FAQ).filter(
+            models.FAQ.business_profile_id == business_id,
+            models.FAQ.is_active == True
+        ).all()
+        for faq in faqs:
+            index.upsert(faq.id, faq.question, faq.answer, faq.priority)
+        return index
+
+
+faq_indexes = FAQIndexRegistry(
+    maxsize=int(os.getenv("FAQ_INDEX_CACHE_SIZE", "1024")),
+    threshold=float(os.getenv("FAQ_MATCH_THRESHOLD", "0.75")),
+    ttl=float(os.getenv("FAQ_INDEX_TTL_SECONDS", "300")),
+)
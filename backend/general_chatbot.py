@@ -1,15 +1,15 @@
 # general_chatbot.py
-import google.generativeai as genai
+from typing import AsyncIterator, Dict, List, Optional
+from contextlib import aclosing
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from llm_backends import LLMBackend
 load_dotenv()
 class GeminiGeneralBot:
-    def __init__(self, api_key: str):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
+    def __init__(self, backend: LLMBackend):
+        self.backend = backend
         self.context = self._build_context()
-        self.session_history = []  # Initialize an empty list for session history
 
     def _build_context(self) -> str:
         return f"""
@@ -20,27 +20,30 @@ class GeminiGeneralBot:
        """
 
 
-    async def get_response(self, message: str) -> str:
-        """Get response from Gemini API"""
+    async def get_response(self, message: str, history: Optional[List[Dict]] = None) -> str:
+        """Get response from the LLM backend, continuing the conversation in ``history``"""
         try:
-            # Prepare chat
-            chat = self.model.start_chat(history=self.session_history)
-
             # Add context and get response
-            response = chat.send_message(
+            response_text = await self.backend.generate(
                 f"{self.context}\n\nUser Question: {message}",
+                history=history
             )
-            # Extract and format response
-            response_text = response.text
-
-            # Update the session history
-            self.session_history.append({"role": "user", "parts": [message]})
-            self.session_history.append({"role": "model", "parts": [response_text]})
-             # Limit the history
-            if len(self.session_history) > 10:
-                self.session_history = self.session_history[-10:]
 
             return response_text
 
         except Exception as e:
-            return f"I apologize, but I'm having trouble processing your request. Please try again or contact support. Error: {str(e)}"
\ No newline at end of file
+            return f"I apologize, but I'm having trouble processing your request. Please try again or contact support. Error: {str(e)}"
+
+    async def stream_response(self, message: str, history: Optional[List[Dict]] = None) -> AsyncIterator[str]:
+        """Stream the response from the LLM backend"""
+        try:
+            stream = self.backend.stream(
+                f"{self.context}\n\nUser Question: {message}",
+                history=history
+            )
+            async with aclosing(stream):
+                async for chunk in stream:
+                    yield chunk
+
+        except Exception as e:
+            yield f"I apologize, but I'm having trouble processing your request. Please try again or contact support. Error: {str(e)}"
@@ -0,0 +1,222 @@
+# llm_backends.py
+import asyncio
+import hashlib
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+from metrics import CHAT_STAGE_SECONDS, LLM_ERRORS
+
+load_dotenv()
+
+_configured_api_key = None
+
+
+def configure_genai(api_key: str):
+    """Configure the Gemini client once per process (and again only if the key changes)."""
+    global _configured_api_key
+    if api_key != _configured_api_key:
+        genai.configure(api_key=api_key)
+        _configured_api_key = api_key
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for budgeting prompts and history."""
+    return (len(text) + 3) // 4
+
+
+class LLMError(Exception):
+    """Raised when a backend cannot produce a response."""
+
+
+class LLMTimeoutError(LLMError):
+    """Raised when waiting for a slot or for the generation itself takes too long."""
+
+
+class LLMBackend:
+    """Async text-generation backend shared by all bots in the process.
+
+    Subclasses implement ``_generate`` and, when the upstream supports it,
+    ``_stream``. The base class caps the number of
+    generations in flight and applies the queue and generation timeouts, so a
+    single worker can hold many chats without blocking the event loop.
+    """
+
+    def __init__(self, max_concurrency: int = 100, timeout: float = 30.0, queue_timeout: float = 10.0):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def generate(
+        self,
+        prompt: str,
+        history: Optional[List[Dict]] = None,
+        max_output_tokens: Optional[int] = None
+    ) -> str:
+        """Generate a reply to ``prompt`` given prior ``history`` turns."""
+        with CHAT_STAGE_SECONDS.labels("llm").time():
+            try:
+                await self._acquire()
+                try:
+                    return await asyncio.wait_for(
+                        self._generate(prompt, history or [], max_output_tokens),
+                        timeout=self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError(f"LLM generation timed out after {self.timeout}s")
+                finally:
+                    self._release()
+            except Exception as e:
+                # Bots turn failures into an apology reply, so count them here
+                LLM_ERRORS.labels(type(e).__name__).inc()
+                raise
+
+    async def stream(
+        self,
+        prompt: str,
+        history: Optional[List[Dict]] = None,
+        max_output_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Yield the reply as text chunks as soon as the upstream produces them.
+
+        The timeout applies to the wait for each chunk rather than to the whole
+        generation, and the concurrency slot is held until the stream is closed.
+        """
+        with CHAT_STAGE_SECONDS.labels("llm").time():
+            try:
+                await self._acquire()
+            except Exception as e:
+                LLM_ERRORS.labels(type(e).__name__).inc()
+                raise
+            chunks = self._stream(prompt, history or [], max_output_tokens)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise LLMTimeoutError(f"No LLM output for {self.timeout}s")
+                    if chunk:
+                        yield chunk
+            except Exception as e:
+                LLM_ERRORS.labels(type(e).__name__).inc()
+                raise
+            finally:
+                await chunks.aclose()
+                self._release()
+
+    async def _generate(self, prompt: str, history: List[Dict], max_output_tokens: Optional[int]) -> str:
+        raise NotImplementedError
+
+    async def _stream(self, prompt: str, history: List[Dict], max_output_tokens: Optional[int]) -> AsyncIterator[str]:
+        # Backends without native streaming deliver the whole reply as one chunk
+        yield await self._generate(prompt, history, max_output_tokens)
+
+    async def _acquire(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"No LLM slot available after {self.queue_timeout}s")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+class GeminiBackend(LLMBackend):
+    def __init__(self, api_key: str, model_name: str = 'gemini-pro', **kwargs):
+        super().__init__(**kwargs)
+        configure_genai(api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    async def _generate(self, prompt: str, history: List[Dict], max_output_tokens: Optional[int]) -> str:
+        chat = self.model.start_chat(history=history)
+        generation_config = {"max_output_tokens": max_output_tokens} if max_output_tokens else None
+        response = await chat.send_message_async(
+            prompt,
+            generation_config=generation_config,
+            request_options={"timeout": self.timeout}
+        )
+        return response.text
+
+    async def _stream(self, prompt: str, history: List[Dict], max_output_tokens: Optional[int]) -> AsyncIterator[str]:
+        chat = self.model.start_chat(history=history)
+        generation_config = {"max_output_tokens": max_output_tokens} if max_output_tokens else None
+        response = await chat.send_message_async(
+            prompt,
+            generation_config=generation_config,
+            stream=True,
+            request_options={"timeout": self.timeout}
+        )
+        async for chunk in response:
+            yield chunk.text
+
+
+class StubBackend(LLMBackend):
+    """Deterministic, network-free backend for local development and load tests.
+
+    The reply depends only on the prompt, and ``latency`` (seconds) simulates
+    upstream generation time.
+    """
+
+    def __init__(self, latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    async def _generate(self, prompt: str, history: List[Dict], max_output_tokens: Optional[int]) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._reply(prompt)
+
+    async def _stream(self, prompt: str, history: List[Dict], max_output_tokens: Optional[int]) -> AsyncIterator[str]:
+        words = self._reply(prompt).split(" ")
+        for i, word in enumerate(words):
+            if self.latency:
+                await asyncio.sleep(self.latency / len(words))
+            yield word if i == 0 else " " + word
+
+    @staticmethod
+    def _reply(prompt: str) -> str:
+        question = prompt.rsplit("User Question:", 1)[-1].strip()
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"[stub:{digest}] You asked: {question}"
+
+
+def create_backend_from_env() -> LLMBackend:
+    """Build the backend selected by ``LLM_BACKEND`` (``gemini`` or ``stub``)."""
+    kwargs = dict(
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "100")),
+        timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+        queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10")),
+    )
+    name = os.getenv("LLM_BACKEND", "gemini").lower()
+    if name == "stub":
+        return StubBackend(latency=float(os.getenv("STUB_LATENCY_MS", "0")) / 1000, **kwargs)
+    if name == "gemini":
+        return GeminiBackend(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            model_name=os.getenv("GEMINI_MODEL", "gemini-pro"),
+            **kwargs
+        )
+    raise ValueError(f"Unknown LLM_BACKEND: {name}")
+
+
+_backend: Optional[LLMBackend] = None
+
+
+def get_llm_backend() -> LLMBackend:
+    """Process-wide backend, created on first use."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend_from_env()
+    return _backend
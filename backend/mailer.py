@@ -0,0 +1,172 @@
+# mailer.py
+import asyncio
+import logging
+import os
+import random
+import time
+from email.message import EmailMessage
+from typing import List, Optional
+
+import aiosmtplib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+class MailSettings:
+    """SMTP settings read once from the MAIL_* environment variables"""
+
+    def __init__(self):
+        self.server = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+        self.port = int(os.getenv("MAIL_PORT", "587"))
+        self.username = os.getenv("MAIL_USERNAME")
+        self.password = os.getenv("MAIL_PASSWORD")
+        self.sender = os.getenv("MAIL_FROM")
+        self.starttls = _env_flag("MAIL_STARTTLS", "true")
+        self.ssl_tls = _env_flag("MAIL_SSL_TLS", "false")
+        self.use_credentials = _env_flag("USE_CREDENTIALS", "true")
+        self.timeout = float(os.getenv("MAIL_TIMEOUT_SECONDS", "30"))
+
+
+class MailDispatcher:
+    """Background outbound mail queue served by a small pool of persistent SMTP connections.
+
+    ``enqueue`` returns as soon as the message is queued. Each of ``pool_size``
+    workers keeps one SMTP connection open across messages, reconnecting when
+    the server drops it, and retries failed sends with exponential backoff.
+    ``stop`` gives the queue at most ``drain_timeout`` seconds to empty, so an
+    unreachable server can't hold up shutdown.
+    """
+
+    def __init__(self, settings: Optional[MailSettings] = None, pool_size: int = 2, max_queue: int = 1000,
+                 max_retries: int = 5, backoff: float = 1.0, idle_timeout: float = 60, drain_timeout: float = 30):
+        self.settings = settings or MailSettings()
+        self.pool_size = pool_size
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.drain_timeout = drain_timeout
+        self.sent = 0
+        self.failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        if not self._workers:
+            self._queue = self._queue or asyncio.Queue(maxsize=self.max_queue)
+            loop = asyncio.get_running_loop()
+            self._workers = [loop.create_task(self._worker()) for _ in range(self.pool_size)]
+
+    async def enqueue(self, recipient: str, subject: str, html: str):
+        message = EmailMessage()
+        message["From"] = self.settings.sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(html, subtype="html")
+        self.start()
+        await self._queue.put(message)
+
+    async def stop(self):
+        """Send what is still queued within ``drain_timeout`` seconds, then close the connections."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            dropped = 0
+            while not self._queue.empty():
+                dropped += self._queue.get_nowait() is not None
+            self.failed += dropped
+            logger.error("Mail queue not drained within %gs; dropped %d queued messages",
+                         self.drain_timeout, dropped)
+        self._workers = []
+
+    async def _drain(self):
+        for _ in self._workers:
+            await self._queue.put(None)
+        await asyncio.gather(*self._workers)
+
+    async def _worker(self):
+        smtp: Optional[aiosmtplib.SMTP] = None
+        last_used = 0.0
+        try:
+            while True:
+                message = await self._queue.get()
+                if message is None:
+                    return
+                if smtp is not None and time.monotonic() - last_used > self.idle_timeout:
+                    # Servers drop idle sessions; start fresh rather than fail the first send
+                    smtp = await self._close(smtp)
+                try:
+                    smtp = await self._send(smtp, message)
+                except asyncio.CancelledError:
+                    self.failed += 1  # stop() gave up on it
+                    raise
+                last_used = time.monotonic()
+        finally:
+            await self._close(smtp)
+
+    async def _send(self, smtp: Optional[aiosmtplib.SMTP], message: EmailMessage) -> Optional[aiosmtplib.SMTP]:
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                if smtp is None:
+                    smtp = await self._connect()
+                await smtp.send_message(message)
+                self.sent += 1
+                return smtp
+            except Exception as e:
+                smtp = await self._close(smtp)
+                if attempt == self.max_retries:
+                    break
+                delay = self.backoff * 2 ** (attempt - 1) * (1 + random.random() / 2)
+                logger.warning("Sending mail to %s failed (attempt %d): %s; retrying in %.1fs",
+                               message["To"], attempt, e, delay)
+                await asyncio.sleep(delay)
+        self.failed += 1
+        logger.error("Giving up on mail to %s after %d attempts", message["To"], self.max_retries)
+        return smtp
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        settings = self.settings
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.server,
+            port=settings.port,
+            use_tls=settings.ssl_tls,
+            start_tls=settings.starttls,
+            timeout=settings.timeout
+        )
+        await smtp.connect()
+        if settings.use_credentials:
+            await smtp.login(settings.username, settings.password)
+        return smtp
+
+    @staticmethod
+    async def _close(smtp: Optional[aiosmtplib.SMTP]) -> None:
+        if smtp is not None:
+            try:
+                await smtp.quit()
+            except Exception:
+                smtp.close()
+        return None
+
+
+mail_dispatcher = MailDispatcher(
+    pool_size=int(os.getenv("MAIL_POOL_SIZE", "2")),
+    max_queue=int(os.getenv("MAIL_QUEUE_SIZE", "1000")),
+    max_retries=int(os.getenv("MAIL_MAX_RETRIES", "5")),
+    drain_timeout=float(os.getenv("MAIL_DRAIN_TIMEOUT_SECONDS", "30")),
+)
@@ -1,6 +1,6 @@
 #models.py
 
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text, ForeignKey, JSON, Float
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Date, Text, ForeignKey, JSON, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -16,16 +16,18 @@ class User(Base):
     is_verified = Column(Boolean, default=False)
     verification_token = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # set while the account is being purged
+    purge_started_at = Column(DateTime(timezone=True), nullable=True)  # lease of the worker purging it
     
-    # Relationships
-    business_profile = relationship("BusinessProfile", back_populates="user", uselist=False)
-    chatbot_config = relationship("ChatbotConfig", back_populates="user", uselist=False)
+    # Relationships; children are removed by ON DELETE CASCADE, never loaded to be deleted
+    business_profile = relationship("BusinessProfile", back_populates="user", uselist=False, passive_deletes=True)
+    chatbot_config = relationship("ChatbotConfig", back_populates="user", uselist=False, passive_deletes=True)
 
 class BusinessProfile(Base):
     __tablename__ = "business_profiles"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     
     # Basic Info
     business_name = Column(String)
@@ -43,6 +45,7 @@ class BusinessProfile(Base):
     
     # Business Hours
     business_hours = Column(JSON)  # Store as JSON for flexibility
+    timezone = Column(String, nullable=True)  # IANA name the hours are in; null uses BUSINESS_TIMEZONE, else hours are not enforced
     
     # Business Details
     description = Column(Text)
@@ -60,17 +63,19 @@ class BusinessProfile(Base):
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # detached from its user and being purged
+    purge_started_at = Column(DateTime(timezone=True), nullable=True)  # lease of the worker purging it
     
     # Relationships
     user = relationship("User", back_populates="business_profile")
-    faqs = relationship("FAQ", back_populates="business_profile")
-    chat_interactions = relationship("ChatInteraction", back_populates="business_profile")
+    faqs = relationship("FAQ", back_populates="business_profile", passive_deletes=True)
+    chat_interactions = relationship("ChatInteraction", back_populates="business_profile", passive_deletes=True)
 
 class ChatbotConfig(Base):
     __tablename__ = "chatbot_configs"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     
     # Chatbot Personality
     chatbot_name = Column(String)
@@ -96,6 +101,14 @@ class ChatbotConfig(Base):
     enable_analytics = Column(Boolean, default=True)
     save_chat_history = Column(Boolean, default=True)
     enable_email_transcript = Column(Boolean, default=False)
+    classification_rules = Column(JSON, nullable=True)  # {"categories": {name: [keywords]}, "sentiment": {term: weight}}
+    
+    # Admission control; null uses the server defaults
+    rate_limit_per_minute = Column(Integer, nullable=True)
+    rate_limit_burst = Column(Integer, nullable=True)
+    
+    # Days chat interactions stay in the live table before archiving; null uses CHAT_RETENTION_DAYS
+    retention_days = Column(Integer, nullable=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -107,7 +120,7 @@ class FAQ(Base):
     __tablename__ = "faqs"
     
     id = Column(Integer, primary_key=True, index=True)
-    business_profile_id = Column(Integer, ForeignKey("business_profiles.id"))
+    business_profile_id = Column(Integer, ForeignKey("business_profiles.id", ondelete="CASCADE"))
     question = Column(String)
     answer = Column(Text)
     category = Column(String, nullable=True)
@@ -122,9 +135,14 @@ class FAQ(Base):
 
 class ChatInteraction(Base):
     __tablename__ = "chat_interactions"
+    __table_args__ = (
+        # Serves per-business, time-ranged analytics without scanning other tenants;
+        # the trailing id makes it the keyset for history pagination and export
+        Index("ix_chat_interactions_business_timestamp", "business_profile_id", "timestamp", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    business_profile_id = Column(Integer, ForeignKey("business_profiles.id"))
+    business_profile_id = Column(Integer, ForeignKey("business_profiles.id", ondelete="CASCADE"))
     user_message = Column(Text)
     bot_response = Column(Text)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
@@ -134,4 +152,37 @@ class ChatInteraction(Base):
     sentiment_score = Column(Float, nullable=True)
     
     # Relationships
-    business_profile = relationship("BusinessProfile", back_populates="chat_interactions")
\ No newline at end of file
+    business_profile = relationship("BusinessProfile", back_populates="chat_interactions")
+
+
+class ChatAnalyticsDaily(Base):
+    """Per business x day x category rollup of chat_interactions, kept current by the chat writer"""
+    __tablename__ = "chat_analytics_daily"
+    __table_args__ = (
+        UniqueConstraint("business_profile_id", "day", "category", name="uq_chat_analytics_daily_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    business_profile_id = Column(Integer, ForeignKey("business_profiles.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    category = Column(String, nullable=False)
+    message_count = Column(Integer, nullable=False, default=0)
+    sentiment_sum = Column(Float, nullable=False, default=0)
+    sentiment_count = Column(Integer, nullable=False, default=0)
+
+
+class ChatArchiveFile(Base):
+    """A Parquet file of chat_interactions moved out of the live table by the retention job"""
+    __tablename__ = "chat_archive_files"
+    __table_args__ = (
+        Index("ix_chat_archive_files_business_window", "business_profile_id", "window_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    business_profile_id = Column(Integer, ForeignKey("business_profiles.id", ondelete="CASCADE"), nullable=False)
+    path = Column(String, nullable=False)  # relative to CHAT_ARCHIVE_DIR
+    window_start = Column(DateTime(timezone=True), nullable=False)
+    window_end = Column(DateTime(timezone=True), nullable=False)
+    row_count = Column(Integer, nullable=False)
+    purged = Column(Boolean, nullable=False, default=False)  # rows deleted from chat_interactions
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
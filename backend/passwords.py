@@ -0,0 +1,105 @@
+# passwords.py
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+_contexts = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    # One context per cost, built lazily in whichever process runs the work
+    context = _contexts.get(rounds)
+    if context is None:
+        context = _contexts[rounds] = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    return context
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, hashed)
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, size-limited worker pool.
+
+    A process pool by default, so hashing uses other cores and never holds the
+    event loop or the shared threadpool that serves chat traffic. At most
+    ``max_pending`` jobs are submitted at once; further callers wait their turn.
+    ``verify_and_update`` also returns a new hash when the stored one was made
+    with a different cost than ``rounds``, so callers can rehash on login.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 64, rounds: int = BCRYPT_ROUNDS, use_processes: bool = True):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.use_processes = use_processes
+        self.waiting = 0
+        self.pending = 0
+        self.completed = 0
+        self._executor: Optional[Executor] = None
+        self._slots = asyncio.Semaphore(max_pending)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(_verify_and_update, password, hashed, self.rounds)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "waiting": self.waiting,
+            "pending": self.pending,
+            "completed": self.completed,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                # spawn: forking a process that already runs an event loop and threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1)))),
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64")),
+    use_processes=os.getenv("PASSWORD_HASH_EXECUTOR", "process").lower() == "process",
+)
@@ -0,0 +1,148 @@
+# profiling.py
+import cProfile
+import contextvars
+import logging
+import os
+import random
+import re
+import secrets
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+
+
+@dataclass
+class SQLStats:
+    statements: int = 0
+    seconds: float = 0.0
+
+
+_request_sql: contextvars.ContextVar[Optional[SQLStats]] = contextvars.ContextVar("request_sql", default=None)
+_statement_start: contextvars.ContextVar[float] = contextvars.ContextVar("statement_start", default=0.0)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_sql.get() is not None:
+        _statement_start.set(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_sql.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += time.perf_counter() - _statement_start.get()
+
+
+def instrument_engines(engines: Iterable):
+    """Count statements and time spent in the database for the request being traced.
+
+    Outside a traced request the listeners return after one context-variable lookup.
+    """
+    for engine in engines:
+        engine = getattr(engine, "sync_engine", engine)
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles individual requests on demand.
+
+    A request is profiled when it carries ``X-Profile: <token>`` matching
+    ``token``, or at random with probability ``sample_rate``. It then runs under
+    cProfile and the stats are dumped to ``output_dir`` in pstats format (open
+    with ``python -m pstats`` or snakeviz); the file name is returned in the
+    ``X-Profile-Id`` response header. cProfile traces the whole event-loop
+    thread, so work of concurrent requests can show up too, and only one request
+    is profiled at a time. Profiled requests, and every request when
+    ``log_sql`` is set, log their SQL statement count and time.
+
+    Requests that are neither profiled nor SQL-logged are passed straight
+    through after a header scan (only when a token is set).
+    """
+
+    def __init__(self, app, token: Optional[str] = None, sample_rate: float = 0.0,
+                 output_dir: Optional[str] = None, log_sql: bool = False):
+        self.app = app
+        self.token = token
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir or os.path.join(tempfile.gettempdir(), "retailai-profiles")
+        self.log_sql = log_sql
+        self._busy = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = self._should_profile(scope) and self._busy.acquire(blocking=False)
+        if not profile and not self.log_sql:
+            await self.app(scope, receive, send)
+            return
+
+        stats = SQLStats()
+        token = _request_sql.set(stats)
+        profiler = cProfile.Profile() if profile else None
+        profile_id = self._profile_id(scope) if profile else None
+
+        async def send_with_id(message):
+            if profile_id and message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-profile-id", profile_id.encode("latin-1"))]}
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            if profiler:
+                profiler.enable()
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if profiler:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+            _request_sql.reset(token)
+            if profiler:
+                try:
+                    self._dump(profiler, profile_id)
+                finally:
+                    self._busy.release()
+            logger.info(
+                "%s %s: %.1f ms, %d SQL statements in %.1f ms%s",
+                scope["method"], scope["path"], elapsed * 1000, stats.statements, stats.seconds * 1000,
+                f", profile {profile_id}" if profile_id else ""
+            )
+
+    def _should_profile(self, scope) -> bool:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER.encode() and secrets.compare_digest(value, self.token.encode()):
+                    return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @staticmethod
+    def _profile_id(scope) -> str:
+        path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        return f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{path}-{secrets.token_hex(3)}.pstats"
+
+    def _dump(self, profiler: cProfile.Profile, profile_id: str):
+        os.makedirs(self.output_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.output_dir, profile_id))
+
+
+def profiling_options_from_env() -> dict:
+    return {
+        "token": os.getenv("PROFILE_TOKEN") or None,
+        "sample_rate": float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        "output_dir": os.getenv("PROFILE_DIR") or None,
+        "log_sql": os.getenv("PROFILE_LOG_SQL", "false").lower() in ("1", "true", "yes"),
+    }
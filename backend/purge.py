@@ -0,0 +1,234 @@
+# purge.py
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session
+
+import models
+from archive import ARCHIVE_DIR
+from database import SessionLocal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Purged in this order; the business_profiles row itself goes last
+_BUSINESS_TABLES = (models.ChatInteraction, models.ChatAnalyticsDaily, models.FAQ)
+
+
+def mark_business_deleted(db: Session, business_id: int):
+    """Detach a business profile from its user and flag it for purging (caller commits).
+
+    One-row update, so the request returns at once and the user can set up a
+    new profile while the old one's data is removed in the background.
+    """
+    db.execute(
+        update(models.BusinessProfile)
+        .where(models.BusinessProfile.id == business_id)
+        .values(user_id=None, deleted_at=datetime.utcnow())
+    )
+
+
+def mark_user_deleted(db: Session, user_id: int):
+    """Deactivate a user, detach their business profile and flag both for purging (caller commits)."""
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(is_active=False, deleted_at=datetime.utcnow())
+    )
+    db.execute(
+        update(models.BusinessProfile)
+        .where(models.BusinessProfile.user_id == user_id)
+        .values(user_id=None, deleted_at=datetime.utcnow())
+    )
+
+
+class AccountPurger:
+    """Background task removing deleted accounts and business profiles in chunks.
+
+    Each statement deletes at most ``chunk_size`` rows and commits, with a
+    ``pause`` in between, so even a tenant with millions of chat interactions
+    never holds long locks or pins a request worker. Anything still flagged
+    as deleted when the task starts (e.g. after a restart) is picked up again.
+
+    Every worker process runs a purger, so a job is claimed first by stamping
+    ``purge_started_at``; the stamp is renewed after each chunk and a claim
+    older than ``lease`` seconds (its worker died) can be taken over.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        chunk_size: int = 5000,
+        pause: float = 0.05,
+        lease: float = 300
+    ):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.lease = lease
+        self.purged = 0
+        self.failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def enqueue(self, kind: str, target_id: int):
+        """Schedule a purge of ("business", business_id) or ("user", user_id) already marked deleted."""
+        self.start()
+        self._queue.put_nowait((kind, target_id))
+
+    async def stop(self):
+        """Stop after the current chunk; unfinished purges resume on the next start."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        try:
+            for job in await asyncio.to_thread(self._pending):
+                self._queue.put_nowait(job)
+        except Exception:
+            logger.exception("Could not load pending account purges")
+
+        while True:
+            kind, target_id = await self._queue.get()
+            try:
+                if kind == "business":
+                    done = await self._purge_business(target_id)
+                else:
+                    done = await self._purge_user(target_id)
+                if done:
+                    self.purged += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Failed to purge %s %s; it will be retried on restart", kind, target_id)
+
+    def _pending(self):
+        db = self.session_factory()
+        try:
+            businesses = db.query(models.BusinessProfile.id).filter(models.BusinessProfile.deleted_at.isnot(None))
+            users = db.query(models.User.id).filter(models.User.deleted_at.isnot(None))
+            return [("business", business_id) for business_id, in businesses] + \
+                [("user", user_id) for user_id, in users]
+        finally:
+            db.close()
+
+    async def _purge_business(self, business_id: int) -> bool:
+        claim = await asyncio.to_thread(self._claim, models.BusinessProfile, business_id)
+        if claim is None:
+            logger.info("Business %s is already being purged elsewhere", business_id)
+            return False
+        for model in _BUSINESS_TABLES:
+            condition = model.business_profile_id == business_id
+            # Only an empty chunk means done: another statement may have deleted some of ours
+            while await asyncio.to_thread(self._delete_chunk, model, condition):
+                claim = await asyncio.to_thread(self._claim, models.BusinessProfile, business_id, claim)
+                if claim is None:
+                    raise RuntimeError(f"Lost the purge claim on business {business_id}")
+                await asyncio.sleep(self.pause)
+        await asyncio.to_thread(self._delete_archives, business_id)
+        await asyncio.to_thread(self._delete_business_row, business_id)
+        logger.info("Purged business %s", business_id)
+        return True
+
+    async def _purge_user(self, user_id: int) -> bool:
+        if await asyncio.to_thread(self._claim, models.User, user_id) is None:
+            logger.info("User %s is already being purged elsewhere", user_id)
+            return False
+        await asyncio.to_thread(self._delete_chunk, models.ChatbotConfig, models.ChatbotConfig.user_id == user_id)
+        await asyncio.to_thread(self._delete_chunk, models.User, models.User.id == user_id)
+        logger.info("Purged user %s", user_id)
+        return True
+
+    def _claim(self, model, target_id: int, renew: Optional[datetime] = None) -> Optional[datetime]:
+        """Stamp ``purge_started_at`` if the job is free, its lease expired or (``renew``) it is still ours.
+
+        Returns the new stamp, or None when another worker holds the job.
+        """
+        table = model.__table__
+        now = datetime.utcnow()
+        if renew is None:
+            owned = or_(table.c.purge_started_at.is_(None),
+                        table.c.purge_started_at < now - timedelta(seconds=self.lease))
+        else:
+            owned = table.c.purge_started_at == renew
+        db = self.session_factory()
+        try:
+            count = db.execute(
+                update(table)
+                .where(table.c.id == target_id, table.c.deleted_at.isnot(None), owned)
+                .values(purge_started_at=now)
+            ).rowcount
+            db.commit()
+            return now if count else None
+        finally:
+            db.close()
+
+    def _delete_chunk(self, model, condition) -> int:
+        table = model.__table__
+        db = self.session_factory()
+        try:
+            chunk = select(table.c.id).where(condition).limit(self.chunk_size).scalar_subquery()
+            count = db.execute(delete(table).where(table.c.id.in_(chunk))).rowcount
+            db.commit()
+            return count
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _delete_business_row(self, business_id: int):
+        # Sweeps rows the chat writer committed after the chunked pass in the same
+        # transaction as the profile, so the delete can't trip the foreign keys
+        db = self.session_factory()
+        try:
+            for model in _BUSINESS_TABLES:
+                db.execute(delete(model.__table__).where(model.business_profile_id == business_id))
+            db.execute(delete(models.BusinessProfile.__table__).where(models.BusinessProfile.id == business_id))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _delete_archives(self, business_id: int):
+        db = self.session_factory()
+        try:
+            archive_files = db.query(models.ChatArchiveFile).filter_by(business_profile_id=business_id).all()
+            for archive_file in archive_files:
+                try:
+                    os.remove(os.path.join(ARCHIVE_DIR, archive_file.path))
+                except FileNotFoundError:
+                    pass
+                db.delete(archive_file)
+            db.commit()
+        finally:
+            db.close()
+
+
+account_purger = AccountPurger(
+    chunk_size=int(os.getenv("PURGE_CHUNK_SIZE", "5000")),
+    pause=float(os.getenv("PURGE_PAUSE_SECONDS", "0.05")),
+    lease=float(os.getenv("PURGE_LEASE_SECONDS", "300")),
+)
@@ -0,0 +1,75 @@
+# response_cache.py
+import os
+import re
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from lru import LRUCache
+
+load_dotenv()
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Case-fold and strip punctuation/extra whitespace so trivially different phrasings share an entry."""
+    message = _PUNCTUATION.sub(" ", message.casefold())
+    return _WHITESPACE.sub(" ", message).strip()
+
+
+class ResponseCache:
+    """TTL + LRU cache of bot responses keyed by (business_id, normalized message).
+
+    Entries must be dropped with ``invalidate`` whenever the business's profile
+    or chatbot config changes, since responses are derived from both. Writers
+    pass the ``generation`` they read before calling the LLM so that a response
+    computed from a superseded profile is not cached after an invalidation.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: Optional[float] = 3600):
+        self.enabled = maxsize > 0
+        self._entries = LRUCache(maxsize=max(maxsize, 1), ttl=ttl)
+        self._generations = {}
+
+    @property
+    def hits(self) -> int:
+        return self._entries.hits
+
+    @property
+    def misses(self) -> int:
+        return self._entries.misses
+
+    def get(self, business_id: int, message: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        return self._entries.get((business_id, normalize_message(message)))
+
+    def generation(self, business_id: int) -> int:
+        return self._generations.get(business_id, 0)
+
+    def set(self, business_id: int, message: str, response: str, generation: Optional[int] = None) -> None:
+        if not self.enabled:
+            return
+        if generation is not None and generation != self.generation(business_id):
+            return
+        self._entries.set((business_id, normalize_message(message)), response)
+
+    def invalidate(self, business_id: int) -> int:
+        self._generations[business_id] = self.generation(business_id) + 1
+        return self._entries.pop_matching(lambda key: key[0] == business_id)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self._entries.evictions,
+        }
+
+
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+)
@@ -0,0 +1,54 @@
+# retrieval.py
+import zlib
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from faq_index import tokenize
+
+FEATURE_DIM = 2048
+MIN_SCORE = 0.1  # below this, overlap is mostly shared character trigrams rather than shared meaning
+
+
+def _terms(text: str) -> List[str]:
+    tokens = tokenize(text)
+    terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    # Character trigrams let "open" match "opening" and "pay" match "payment"
+    for token in tokens:
+        marked = f"<{token}>"
+        terms.extend(marked[i:i + 3] for i in range(len(marked) - 2))
+    return terms
+
+
+def hashed_features(text: str, dim: int = FEATURE_DIM) -> np.ndarray:
+    """L2-normalized bag of hashed words, word bigrams and character trigrams (log-scaled counts)."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for term in _terms(text):
+        # crc32 rather than hash(): stable across processes and restarts
+        vector[zlib.crc32(term.encode("utf-8")) % dim] += 1
+    np.log1p(vector, out=vector)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ChunkIndex:
+    """Small in-memory vector index over a fixed list of text chunks.
+
+    Chunks are embedded once with ``hashed_features`` into a dense matrix;
+    a query is one matrix-vector product, so lookup needs no model or service.
+    """
+
+    def __init__(self, chunks: Sequence[str], dim: int = FEATURE_DIM, min_score: float = MIN_SCORE):
+        self.chunks = list(chunks)
+        self.dim = dim
+        self.min_score = min_score
+        self._matrix = np.vstack([hashed_features(chunk, dim) for chunk in self.chunks]) if self.chunks \
+            else np.zeros((0, dim), dtype=np.float32)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Indices and cosine scores of the best ``k`` chunks scoring at least ``min_score``, best first."""
+        if not self.chunks or k <= 0:
+            return []
+        scores = self._matrix @ hashed_features(query, self.dim)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(int(i), float(scores[i])) for i in order if scores[i] >= self.min_score]
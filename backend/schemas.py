@@ -1,7 +1,8 @@
 from pydantic import BaseModel, EmailStr, HttpUrl, constr
 from typing import Optional, Dict, List, Any
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 
 class BusinessHours(BaseModel):
@@ -25,6 +26,7 @@ class BusinessProfileCreate(BaseModel):
     postal_code: str
     country: str
     business_hours: BusinessHours
+    timezone: Optional[str] = None
     description: str
     year_established: Optional[int]
     employee_count: Optional[int]
@@ -34,6 +36,23 @@ class BusinessProfileCreate(BaseModel):
     specialties: Optional[List[str]]
     payment_methods: Optional[List[str]]
 
+    @field_validator("timezone")
+    @classmethod
+    def known_timezone(cls, value: Optional[str]) -> Optional[str]:
+        value = value or None  # the form sends "" when no timezone is picked
+        if value is not None:
+            try:
+                ZoneInfo(value)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f"Unknown timezone: {value}")
+        return value
+
+
+class ClassificationRules(BaseModel):
+    categories: Optional[Dict[str, List[str]]] = None
+    sentiment: Optional[Dict[str, float]] = None
+    default_category: Optional[str] = None
+
 
 class ChatbotConfigCreate(BaseModel):
     chatbot_name: str
@@ -51,6 +70,10 @@ class ChatbotConfigCreate(BaseModel):
     enable_analytics: bool = True
     save_chat_history: bool = True
     enable_email_transcript: bool = False
+    classification_rules: Optional[ClassificationRules] = None
+    rate_limit_per_minute: Optional[int] = Field(None, ge=1)
+    rate_limit_burst: Optional[int] = Field(None, ge=1)
+    retention_days: Optional[int] = Field(None, ge=1)
 
 
 
@@ -88,7 +111,23 @@ class FAQResponse(FAQCreate):
     class Config:
         orm_mode = True
 
+
+class ChatInteractionResponse(BaseModel):
+    id: int
+    timestamp: datetime
+    user_message: Optional[str] = None
+    bot_response: Optional[str] = None
+    category: Optional[str] = None
+    sentiment_score: Optional[float] = None
+
+
+class ChatHistoryPage(BaseModel):
+    items: List[ChatInteractionResponse]
+    next_cursor: Optional[str] = None
+
+
 class ChatAnalysisResponse(BaseModel):
      total_queries: int
      top_categories: List[dict]
-     average_sentiment: float
\ No newline at end of file
+     average_sentiment: float
+     series: Optional[List[dict]] = None
\ No newline at end of file
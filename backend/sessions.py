@@ -0,0 +1,83 @@
+# sessions.py
+import os
+import secrets
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from llm_backends import estimate_tokens
+from lru import LRUCache
+
+load_dotenv()
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(18)
+
+
+def _turn_tokens(turn: Dict) -> int:
+    return sum(estimate_tokens(part) for part in turn["parts"])
+
+
+class SessionStore:
+    """Conversation history per session key, as alternating user/model turns.
+
+    Subclass and override ``get``/``append``/``delete`` to keep sessions in an
+    external store shared between workers.
+    """
+
+    async def get(self, key: str) -> List[Dict]:
+        raise NotImplementedError
+
+    async def append(self, key: str, message: str, response: str):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionStore):
+    """LRU + TTL bounded in-process session store.
+
+    Each session keeps at most ``max_tokens`` (estimated) of history: the
+    oldest exchanges are trimmed first, but the latest one is always kept.
+    Idle sessions expire after ``ttl`` seconds and the least recently used
+    are evicted beyond ``maxsize``, so memory stays bounded under many
+    concurrent visitors.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 1800, max_tokens: int = 2000):
+        self.max_tokens = max_tokens
+        self._sessions = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def get(self, key: str) -> List[Dict]:
+        history = self._sessions.get(key)
+        return list(history) if history else []
+
+    async def append(self, key: str, message: str, response: str):
+        history = list(self._sessions.get(key) or ())
+        history.append({"role": "user", "parts": [message]})
+        history.append({"role": "model", "parts": [response]})
+
+        tokens = sum(_turn_tokens(turn) for turn in history)
+        while tokens > self.max_tokens and len(history) > 2:
+            tokens -= _turn_tokens(history.pop(0)) + _turn_tokens(history.pop(0))
+        # Stored as a tuple so readers can't mutate a session in place
+        self._sessions.set(key, tuple(history))
+
+    async def delete(self, key: str):
+        self._sessions.pop(key)
+
+
+def create_session_store_from_env() -> SessionStore:
+    return InMemorySessionStore(
+        maxsize=int(os.getenv("SESSION_STORE_SIZE", "10000")),
+        ttl=float(os.getenv("SESSION_TTL_SECONDS", "1800")),
+        max_tokens=int(os.getenv("SESSION_MAX_TOKENS", "2000")),
+    )
+
+
+session_store = create_session_store_from_env()
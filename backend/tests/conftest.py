@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Modules import the database settings at import time; keep tests off any real server
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,30 @@
+from classifier import MessageClassifier, default_classifier
+
+
+def test_matches_plural_of_keyword():
+    assert default_classifier.classify("Do you take cards?")[0] == "payment"
+    assert default_classifier.classify("What times are you open?")[0] == "hours"
+
+
+def test_does_not_match_inside_other_words():
+    assert default_classifier.classify("Is there a carding fee?")[0] == "general"
+    assert default_classifier.classify("I'm unhappy")[1] == -1.0
+
+
+def test_matches_keywords_with_punctuation_edges():
+    classifier = MessageClassifier(categories={"hiring": ["c++"], "support": ["24/7"]}, sentiment={})
+    assert classifier.classify("Are you hiring C++ developers?")[0] == "hiring"
+    assert classifier.classify("Is support 24/7?")[0] == "support"
+    assert classifier.classify("Is support 24/75?")[0] == "general"
+
+
+def test_classify_batch_attributes_matches_to_each_message():
+    messages = ["Do you take cards?", "", "thank\nyou", "terrible service", "where are you located"]
+    assert default_classifier.classify_batch(messages) == [
+        ("payment", 0.0),
+        ("general", 0.0),
+        ("general", 1.0),
+        ("services", -1.0),
+        ("location", 0.0),
+    ]
+    assert default_classifier.classify_batch(messages) == [default_classifier.classify(m) for m in messages]
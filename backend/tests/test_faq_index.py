@@ -0,0 +1,24 @@
+from faq_index import FAQIndex
+
+THRESHOLD = 0.75
+
+
+def make_index():
+    index = FAQIndex()
+    index.upsert(1, "Do you deliver?", "Yes, we deliver within 5 miles.")
+    index.upsert(2, "What are your opening hours?", "9am to 5pm, Monday to Friday.")
+    return index
+
+
+def test_matches_rephrased_question():
+    match = make_index().match("do you DELIVER", THRESHOLD)
+    assert match is not None and match[0] == 1
+
+
+def test_long_off_topic_message_with_one_keyword_does_not_match():
+    message = "You didn't deliver my order yesterday and I'm furious, who is the manager?"
+    assert make_index().match(message, THRESHOLD) is None
+
+
+def test_message_without_known_terms_does_not_match():
+    assert make_index().match("tell me a joke", THRESHOLD) is None
@@ -0,0 +1,72 @@
+# user_cache.py
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Mapping, Optional
+
+from dotenv import load_dotenv
+
+import models
+from bot_registry import snapshot_row
+from lru import LRUCache
+
+load_dotenv()
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Detached, read-only view of an authenticated user and their business setup"""
+    id: int
+    email: str
+    company_name: str
+    created_at: Optional[datetime]
+    is_verified: bool
+    business_profile: Optional[Mapping]
+    chatbot_config: Optional[Mapping]
+
+    @property
+    def business_profile_id(self) -> Optional[int]:
+        return self.business_profile['id'] if self.business_profile else None
+
+    @classmethod
+    def from_model(cls, user: models.User) -> "CurrentUser":
+        return cls(
+            id=user.id,
+            email=user.email,
+            company_name=user.company_name,
+            created_at=user.created_at,
+            is_verified=user.is_verified,
+            business_profile=snapshot_row(user.business_profile) if user.business_profile else None,
+            chatbot_config=snapshot_row(user.chatbot_config) if user.chatbot_config else None,
+        )
+
+
+class UserCache:
+    """TTL + LRU cache of CurrentUser snapshots keyed by the token subject (email).
+
+    Entries are dropped explicitly when the user or their profile/config
+    changes in this process; the TTL bounds staleness across worker processes.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60):
+        self.enabled = maxsize > 0 and ttl > 0
+        self._entries = LRUCache(maxsize=max(maxsize, 1), ttl=ttl)
+
+    def get(self, email: str) -> Optional[CurrentUser]:
+        return self._entries.get(email) if self.enabled else None
+
+    def set(self, user: CurrentUser):
+        if self.enabled:
+            self._entries.set(user.email, user)
+
+    def invalidate(self, email: str):
+        self._entries.pop(email)
+
+    def clear(self):
+        self._entries.clear()
+
+
+user_cache = UserCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "60")),
+)
@@ -1,25 +1,14 @@
 # utils.py
 from fastapi import HTTPException
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 import jwt
 from datetime import datetime, timedelta
 from typing import Optional
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
+from mailer import mail_dispatcher
 
-# Email configuration
-conf = ConnectionConfig(
-    MAIL_USERNAME = os.getenv("MAIL_USERNAME"),
-    MAIL_PASSWORD = os.getenv("MAIL_PASSWORD"),
-    MAIL_FROM = os.getenv("MAIL_FROM"),
-    MAIL_PORT = 587,
-    MAIL_SERVER = "smtp.gmail.com",
-    MAIL_STARTTLS = True,
-    MAIL_SSL_TLS = False,
-    USE_CREDENTIALS = True
-)
+load_dotenv()
 
 # JWT utilities
 def create_verification_token(email: str) -> str:
@@ -43,10 +32,10 @@ def verify_token(token: str) -> str:
 async def send_verification_email(email: str, verification_token: str):
     verify_url = f"http://localhost:8000/verify/{verification_token}"
     
-    message = MessageSchema(
-        subject="Verify your email",
-        recipients=[email],
-        body=f"""
+    await mail_dispatcher.enqueue(
+        email,
+        "Verify your email",
+        f"""
         Hi,
         
         Please verify your email by clicking on the link below:
@@ -55,9 +44,5 @@ async def send_verification_email(email: str, verification_token: str):
         This link will expire in 24 hours.
         
         If you didn't request this verification, please ignore this email.
-        """,
-        subtype="html"
+        """
     )
-    
-    fm = FastMail(conf)
-    await fm.send_message(message)
@@ -1,5 +1,11 @@
 import React, { useState, useEffect } from 'react';
 
+// IANA names for the timezone picker; older browsers only get the visitor's own zone
+const browserTimezone = Intl.DateTimeFormat().resolvedOptions().timeZone || '';
+const timezones = typeof Intl.supportedValuesOf === 'function'
+    ? Intl.supportedValuesOf('timeZone')
+    : [browserTimezone].filter(Boolean);
+
 const BusinessForm = ({ onBusinessCreated, initialData, isEdit, onSubmitSuccess }) => {
     const defaultFormData = {
         business_name: '',
@@ -21,6 +27,7 @@ const BusinessForm = ({ onBusinessCreated, initialData, isEdit, onSubmitSuccess
            saturday: {opening: '', closing: ''},
            sunday: {opening: '', closing: ''}
         },
+        timezone: browserTimezone,
         description: '',
         year_established: '',
         employee_count: '',
@@ -111,7 +118,8 @@ const BusinessForm = ({ onBusinessCreated, initialData, isEdit, onSubmitSuccess
                 facebook_url: formData.facebook_url || null,
                 instagram_url: formData.instagram_url || null,
                 twitter_url: formData.twitter_url || null,
-                website: formData.website || null
+                website: formData.website || null,
+                timezone: formData.timezone || null
             };
 
            const config = {
@@ -298,6 +306,20 @@ const BusinessForm = ({ onBusinessCreated, initialData, isEdit, onSubmitSuccess
                             </div>
                         ))}
                     </div>
+                    <div className="md:w-1/3">
+                        <label className="block text-sm font-medium text-gray-700 mb-2">Timezone</label>
+                        <select
+                            name="timezone"
+                            className="w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-indigo-500"
+                            value={formData.timezone || ''}
+                            onChange={handleChange}
+                        >
+                            <option value="">Not set (hours are not enforced)</option>
+                            {timezones.map(zone => (
+                                <option key={zone} value={zone}>{zone}</option>
+                            ))}
+                        </select>
+                    </div>
                 </div>
 
                 {/* Additional Information Section */}